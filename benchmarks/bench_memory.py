@@ -0,0 +1,96 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Peak RSS of basic_plot on a synthetic .csv file with many traces, with and
+without scaling, decimation and the binary cache. Every run happens in a
+fresh process, so that the peaks do not add up.
+
+Other source trees (e.g. a checkout of an older commit made with
+git worktree) can be passed with --tree to compare their peaks with the
+current one:
+
+    git worktree add /tmp/old HEAD~1
+    python benchmarks/bench_memory.py --tree /tmp/old .
+"""
+
+import os
+import sys
+import tempfile
+import subprocess
+from argparse import ArgumentParser
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from generate import write_traces
+
+
+
+# Runs basic_plot in the child process and prints its peak RSS in bytes
+CHILD = """
+import sys, resource
+from plottools.basic_plot import main
+main(sys.argv[1:])
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(peak if sys.platform == "darwin" else peak * 1024)
+"""
+
+CASES = {
+    "plain":            ["-rp", "fast"],
+    "scaled":           ["-rp", "fast", "-ym", "MULTIPLIERS", "-xm", "1e9"],
+    "scaled, no decim": ["-rp", "fast", "-nd", "-ym", "MULTIPLIERS", "-xm", "1e9"],
+    "float32, scaled":  ["-rp", "fast", "-f32", "-ym", "MULTIPLIERS", "-xm", "1e9"],
+    "cached, scaled":   ["-rp", "fast", "-ca", "-ym", "MULTIPLIERS", "-xm", "1e9"],
+}
+
+
+
+def peak_rss(tree, path, options, cache_dir):
+    env = dict(os.environ, PYTHONPATH=tree, MPLBACKEND="Agg", PLOTTOOLS_CACHE_DIR=cache_dir)
+    result = subprocess.run([sys.executable, "-c", CHILD, path] + options,
+                            env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return int(result.stdout.strip().splitlines()[-1])
+
+
+
+def main():
+    p = ArgumentParser(description="Peak RSS of basic_plot on a synthetic .csv file.")
+    p.add_argument("trees", type=str, nargs="*", default=[REPO_ROOT],
+                   help="Source trees to compare. Default is this repository")
+    p.add_argument("--rows", type=float, default=1e6, help="Rows of the generated file. Default 1e6")
+    p.add_argument("--cols", type=int, default=20, help="y columns of the generated file. Default 20")
+    args = p.parse_args()
+
+    trees = [os.path.abspath(tree) for tree in args.trees]
+    multipliers = ["2"] * args.cols
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "traces.csv")
+        write_traces(path, int(args.rows), args.cols)
+        size = os.path.getsize(path)
+        print(f"\n\t{int(args.rows)} rows x {args.cols} traces, {size/1024**2:.0f} MB of .csv, "
+              f"{int(args.rows)*(args.cols+1)*8/1024**2:.0f} MB as float64\n")
+        print("\t" + f"{'peak RSS [MB]':20s}" + "".join(f"{os.path.basename(tree) or tree:>16s}" for tree in trees))
+
+        for case, options in CASES.items():
+            options = [opt for o in options for opt in (multipliers if o == "MULTIPLIERS" else [o])]
+            peaks = []
+            for tree in trees:
+                cache_dir = os.path.join(tmpdir, "cache_" + str(len(peaks)))
+                if "-ca" in options:
+                    # Fill the cache first, the peak of the cached run is measured
+                    peak_rss(tree, path, options, cache_dir)
+                peaks.append(peak_rss(tree, path, options, cache_dir))
+            print(f"\t{case:20s}" + "".join(f"{peak/1024**2:16.0f}" if peak is not None else f"{'failed':>16s}"
+                                            for peak in peaks))
+
+
+
+if __name__ == "__main__":
+    main()
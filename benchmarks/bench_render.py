@@ -0,0 +1,85 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Timing comparison of the render profiles of the plotting scripts. Every
+script is run on the same synthetic .csv with --render publication (LaTeX)
+and --render fast (mathtext + Agg), and the wall time of each run is printed.
+
+Usage: python benchmarks/bench_render.py [-r REPEAT] [-n ROWS]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import subprocess
+import numpy as np
+from argparse import ArgumentParser
+
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPTS = {
+    "basic_plot": ["-x", "t", "-y", "v_{out}", "-l", "a", "b"],
+    "histogr": ["-x", "v", "-y", "N"],
+    "fourier": ["-N", "1024"],
+    "rms_discr": [],
+    }
+
+
+
+def write_csv(path, rows):
+    t = np.arange(rows)
+    y = np.sin(2*np.pi*t*3/1024) + 1e-3*np.random.default_rng(0).standard_normal(rows)
+    np.savetxt(path, np.column_stack((t*1e-9, y, 0.5*y)), delimiter=",", header="t,a,b", comments="")
+
+
+
+def run(script, csv, profile, options):
+    env = dict(os.environ, MPLBACKEND="Agg", PYTHONPATH=REPO_ROOT)
+    cmd = [sys.executable, "-m", f"plottools.{script}", csv, "--render", profile] + options
+    start = time.perf_counter()
+    result = subprocess.run(cmd, env=env, cwd=os.path.dirname(csv), capture_output=True)
+    elapsed = time.perf_counter() - start
+    return elapsed if result.returncode == 0 else None
+
+
+
+def main():
+    p = ArgumentParser(description="Compare the wall time of the publication and fast render profiles.")
+    p.add_argument("-r", "--repeat", type=int, default=3, help="Number of runs per script and profile.")
+    p.add_argument("-n", "--rows", type=int, default=10000, help="Number of rows of the synthetic .csv.")
+    args = p.parse_args()
+
+    profiles = ["fast"]
+    if shutil.which("latex") is not None:
+        profiles.insert(0, "publication")
+    else:
+        print("LaTeX not found, the publication profile is skipped.")
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        csv = os.path.join(tmpdir, "bench.csv")
+        write_csv(csv, args.rows)
+
+        print(f"\n\t{'script':12s}" + "".join(f"{profile:>14s}" for profile in profiles))
+        for script, options in SCRIPTS.items():
+            line = f"\t{script:12s}"
+            for profile in profiles:
+                times = [run(script, csv, profile, options) for _ in range(args.repeat)]
+                if None in times:
+                    line += f"{'failed':>14s}"
+                else:
+                    line += f"{min(times):12.3f} s"
+            print(line)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Per-stage benchmark of the plottools pipelines on synthetic .csv files.
+
+For every (rows, columns) case a file is generated and the stages behind
+each entry point are timed separately: parsing, column selection/scaling,
+decimation, FFT metrics, statistics, rms, FOM join, rendering and savefig.
+Rendering uses the Agg backend, so no display is needed.
+
+Results are saved as .json (by default in benchmarks/results/<commit>.json)
+and two result files can be compared to spot regressions:
+
+    python benchmarks/bench_stages.py run --rows 1e4 1e6 --cols 1 100
+    python benchmarks/bench_stages.py compare results/abc123.json results/def456.json
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import subprocess
+from argparse import ArgumentParser
+
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import plottools as pt
+from plottools.style import setup_style
+from generate import write_runs, write_traces
+
+
+
+def timeit(func, repeat):
+    """Return the best wall time of repeat calls of func and its last result."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+
+def bench_case(tmpdir, rows, cols, repeat):
+    """Time every stage on a file with rows rows and cols y columns."""
+    path = os.path.join(tmpdir, f"traces_{rows}_{cols}.csv")
+    write_traces(path, rows, cols)
+    times = {}
+    record = min(rows, 4096)
+
+    # basic_plot
+    times["parse"], data = timeit(lambda: pt.load_traces(path), repeat)
+    times["parse_projected"], _ = timeit(lambda: pt.load_traces(path, columns=[0, 1], stop=rows//2), repeat)
+    times["parse_chunked"], _ = timeit(lambda: sum(len(c) for c in pt.iter_traces(path, 100000)), repeat)
+    columns = np.arange(1, cols + 1)
+    times["select_scale"], (x, y) = timeit(
+        lambda: (lambda x, y: (2*x, pt.scale_traces(y, np.full(cols, 0.5))))(*pt.select_columns(data, columns)), repeat)
+    times["decimate"], (xd, yd) = timeit(lambda: pt.minmax_decimate(x, y, 3900), repeat)
+
+    # fourier
+    times["fft_metrics"], _ = timeit(
+        lambda: pt.spectrum_metrics(pt.amplitude_spectrum(y[:record].T, record, "hann"), 3, window="hann"), repeat)
+    times["welch"], _ = timeit(lambda: pt.averaged_spectrum(np.array_split(y, 8), min(record, 1024)), repeat)
+
+    # histogr
+    times["stats"], _ = timeit(lambda: pt.RunningStats().update(y).as_dict(), repeat)
+    times["histogram"], _ = timeit(lambda: pt.Histogram(50, (y.min(axis=0), y.max(axis=0))).update(y), repeat)
+
+    # rms_discr
+    times["rms"], _ = timeit(lambda: pt.rms(y), repeat)
+    window = max(rows//100, 1)
+    times["windowed_rms"], _ = timeit(lambda: pt.WindowedRMS(window).update(y), repeat)
+
+    # rendering and savefig
+    plt = setup_style("fast")
+
+    def render():
+        fig, ax = plt.subplots(figsize=(6.5, 4.5))
+        ax.plot(xd, yd, linewidth=1.5)
+        fig.tight_layout()
+        fig.canvas.draw()
+        return fig
+
+    times["render"], fig = timeit(render, repeat)
+    for ext in ("pdf", "png"):
+        times[f"savefig_{ext}"], _ = timeit(lambda: fig.savefig(os.path.join(tmpdir, f"out.{ext}"), dpi=600), repeat)
+    plt.close("all")
+
+    os.remove(path)
+    return times
+
+
+
+def bench_fom(tmpdir, runs, repeat):
+    """Time the keyed FOM join of two Monte Carlo tables with runs rows."""
+    sndr_path = os.path.join(tmpdir, "sndr.csv")
+    pwr_path = os.path.join(tmpdir, "pwr.csv")
+    write_runs(sndr_path, runs, seed=1)
+    write_runs(pwr_path, runs, seed=2, shuffle=True)
+    sndr = pt.load_traces(sndr_path)
+    pwr = pt.load_traces(pwr_path)
+
+    def join():
+        found, power = pt.KeyIndex(pwr[:, 0], pwr[:, 1]).lookup(sndr[:, 0])
+        return pt.walden_fom(sndr[found, 1], power*1e-3, 200e6)
+
+    return {"fom_join": timeit(join, repeat)[0]}
+
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+
+def run(args):
+    commit = git_commit()
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for rows in args.rows:
+            for cols in args.cols:
+                case = f"{int(rows)}x{cols}"
+                print(f"Running {case}...")
+                results[case] = bench_case(tmpdir, int(rows), cols, args.repeat)
+                for stage, seconds in results[case].items():
+                    print(f"\t{stage:16s}{seconds*1e3:12.2f} ms")
+        for runs in args.runs:
+            results[f"fom_{int(runs)}"] = bench_fom(tmpdir, int(runs), args.repeat)
+
+    output = args.output or os.path.join(REPO_ROOT, "benchmarks", "results", f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({"commit": commit,
+                   "time": time.time(),
+                   "machine": platform.machine(),
+                   "processor": platform.processor(),
+                   "python": platform.python_version(),
+                   "numpy": np.__version__,
+                   "matplotlib": matplotlib.__version__,
+                   "results": results}, f, indent=2)
+    print(f"Results saved to {output}")
+
+
+
+def compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    print(f"\n\t{baseline['commit']} -> {current['commit']}\n")
+    regressions = 0
+    for case, stages in current["results"].items():
+        for stage, seconds in stages.items():
+            before = baseline["results"].get(case, {}).get(stage)
+            if before is None:
+                continue
+            ratio = seconds/before if before > 0 else float("inf")
+            flag = "  REGRESSION" if ratio > 1 + args.threshold else ""
+            regressions += bool(flag)
+            print(f"\t{case:16s}{stage:16s}{before*1e3:12.2f}{seconds*1e3:12.2f} ms{ratio:8.2f}x{flag}")
+
+    if regressions:
+        sys.exit(1)
+
+
+
+def main():
+    p = ArgumentParser(description="Per-stage benchmark of the plottools pipelines.")
+    sub = p.add_subparsers(dest="command", required=True)
+
+    p_run = sub.add_parser("run", help="Run the benchmark and save the results")
+    p_run.add_argument("--rows", type=float, nargs="+", default=[1e3, 1e5], help="Rows of the generated files")
+    p_run.add_argument("--cols", type=int, nargs="+", default=[1, 100], help="y columns of the generated files")
+    p_run.add_argument("--runs", type=float, nargs="+", default=[1e5], help="Rows of the FOM tables")
+    p_run.add_argument("-r", "--repeat", type=int, default=3, help="Runs per stage, the best one is kept")
+    p_run.add_argument("-o", "--output", type=str, default=None, help="Results file")
+    p_run.set_defaults(func=run)
+
+    p_cmp = sub.add_parser("compare", help="Compare two results files")
+    p_cmp.add_argument("baseline", type=str)
+    p_cmp.add_argument("current", type=str)
+    p_cmp.add_argument("-t", "--threshold", type=float, default=0.1,
+                       help="Relative slowdown reported as a regression. Default 0.1")
+    p_cmp.set_defaults(func=compare)
+
+    args = p.parse_args()
+    args.func(args)
+
+
+
+if __name__ == "__main__":
+    main()
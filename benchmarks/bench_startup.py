@@ -0,0 +1,86 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Cold-start benchmark of the console scripts declared in setup.cfg. For every
+script the module is imported with `python -X importtime` and the cumulative
+import time of the module is reported, together with the wall time of
+`script --help` (interpreter startup + imports + argument parsing).
+
+Usage: python benchmarks/bench_startup.py [-r REPEAT] [-o results.json]
+"""
+
+import os
+import sys
+import json
+import time
+import subprocess
+import configparser
+from argparse import ArgumentParser
+
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+
+def console_scripts():
+    """Return {script name: module} for the console_scripts in setup.cfg."""
+    config = configparser.ConfigParser()
+    config.read(os.path.join(REPO_ROOT, "setup.cfg"))
+    scripts = {}
+    for line in config["options.entry_points"]["console_scripts"].strip().splitlines():
+        name, target = (field.strip() for field in line.split("="))
+        scripts[name] = target.split(":")[0]
+    return scripts
+
+
+
+def import_time(module, env):
+    """Cumulative import time of module in seconds, measured with -X importtime."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            env=env, capture_output=True, text=True, check=True)
+    for line in result.stderr.splitlines():
+        fields = [field.strip() for field in line.split("|")]
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) * 1e-6
+    return float("nan")
+
+
+
+def help_time(module, env):
+    """Wall time of running the module with --help."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-m", module, "--help"], env=env, capture_output=True, check=True)
+    return time.perf_counter() - start
+
+
+
+def main():
+    p = ArgumentParser(description="Measure the cold-start time of every plottools console script.")
+    p.add_argument("-r", "--repeat", type=int, default=5, help="Number of runs, the minimum is reported.")
+    p.add_argument("-o", "--output", type=str, default=None, help="Save the results to a .json file.")
+    args = p.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    results = {}
+
+    print(f"\n\t{'script':18s}{'import [ms]':>14s}{'--help [ms]':>14s}")
+    for name, module in console_scripts().items():
+        imp = min(import_time(module, env) for _ in range(args.repeat))
+        hlp = min(help_time(module, env) for _ in range(args.repeat))
+        results[name] = {"module": module, "import_s": imp, "help_s": hlp}
+        print(f"\t{name:18s}{imp*1e3:14.1f}{hlp*1e3:14.1f}")
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump({"python": sys.version, "time": time.time(), "results": results}, f, indent=2)
+
+
+
+if __name__ == "__main__":
+    main()
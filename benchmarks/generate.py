@@ -0,0 +1,69 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Generators of synthetic Virtuoso/Spectre-style .csv exports for the
+benchmarks: a header row, a time column and N y columns holding noisy tones
+with a small amount of distortion. Files are written in blocks of rows, so
+that sizes up to 1e8 rows do not need to fit in memory.
+
+Usage: python benchmarks/generate.py out.csv ROWS COLUMNS
+"""
+
+import numpy as np
+from argparse import ArgumentParser
+
+
+
+BLOCK_ROWS = 100000
+
+
+
+def write_traces(path, rows, cols, fsample=1e9, tone_bin=3, record=1024, seed=0):
+    """Write a .csv with a time column and cols traces of rows samples. Trace k
+    is a tone of period record/tone_bin samples with amplitude 1 - k*1e-4,
+    a second harmonic at -60 dB and white noise."""
+    rng = np.random.default_rng(seed)
+    amplitude = 1 - 1e-4*np.arange(cols)
+
+    with open(path, "w") as f:
+        f.write(",".join(["time"] + [f"/out{k} Y" for k in range(cols)]) + "\n")
+        for first in range(0, rows, BLOCK_ROWS):
+            n = np.arange(first, min(first + BLOCK_ROWS, rows))
+            phase = 2*np.pi*tone_bin*n/record
+            tone = np.sin(phase) + 1e-3*np.sin(2*phase)
+            block = amplitude * tone[:, np.newaxis] + 1e-4*rng.standard_normal((len(n), cols))
+            np.savetxt(f, np.column_stack((n/fsample, block)), delimiter=",", fmt="%.9g")
+
+
+
+def write_runs(path, runs, seed=0, shuffle=False):
+    """Write a Monte Carlo result table with a run ID column and one value per
+    run (SNDR-like values around 60 dB), optionally in shuffled order."""
+    rng = np.random.default_rng(seed)
+    ids = np.arange(runs)
+    if shuffle:
+        ids = rng.permutation(ids)
+    values = 60 + 2*rng.standard_normal(runs)
+    np.savetxt(path, np.column_stack((ids, values)), delimiter=",", fmt=["%d", "%.9g"],
+               header="run,value", comments="")
+
+
+
+def main():
+    p = ArgumentParser(description="Write a synthetic Virtuoso-style .csv with a time column and N traces.")
+    p.add_argument("path", type=str, help="Output .csv file")
+    p.add_argument("rows", type=float, help="Number of rows, e.g. 1e6")
+    p.add_argument("cols", type=int, help="Number of y columns")
+    args = p.parse_args()
+
+    write_traces(args.path, int(args.rows), args.cols)
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+plottools is a set of command line scripts for plotting data stored in .csv
+files. The computations behind the scripts are also available as functions
+working on NumPy arrays, so that they can be used in-process without going
+through .csv files:
+
+    import plottools as pt
+    data = pt.load_traces("tran.csv")
+    x, y = pt.select_columns(data, [1, 2])
+    linydata = pt.amplitude_spectrum(y.T, 1024, "hann")
+    thd, sndr, sfdr = pt.spectrum_metrics(linydata, fundam_index=1, window="hann")
+"""
+
+from plottools.csvio import count_columns, is_paired, iter_traces, load_signals, load_traces
+from plottools.traces import scale_traces, select_columns
+from plottools.decimate import minmax_decimate
+from plottools.resample import UniformResampler, resample
+from plottools.spectrum import amplitude_spectrum, averaged_spectrum, enob, harmonic_powers, metrics_table, \
+    spectrum_metrics
+from plottools.stats import Histogram, RunningStats, distribution_stats
+from plottools.rms import WindowedRMS, rms
+from plottools.fom import KeyIndex, schreier_fom, walden_fom
+
+
+
+__all__ = ["count_columns", "is_paired", "iter_traces", "load_signals", "load_traces",
+           "scale_traces", "select_columns",
+           "minmax_decimate",
+           "UniformResampler", "resample",
+           "amplitude_spectrum", "averaged_spectrum", "enob", "harmonic_powers", "metrics_table", "spectrum_metrics",
+           "Histogram", "RunningStats", "distribution_stats",
+           "WindowedRMS", "rms",
+           "KeyIndex", "schreier_fom", "walden_fom"]
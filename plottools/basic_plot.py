@@ -10,12 +10,20 @@ Licensed under GNU license
 """
 
 import numpy as np
-import matplotlib.pyplot as plt
 from argparse import ArgumentParser
+from plottools.cache import add_cache_arguments
+from plottools.csvio import TailReader, count_columns, is_paired, load_signals, load_traces, output_base
+from plottools.decimate import StreamingDecimator, minmax_decimate
+from plottools.output import add_output_arguments, output_options, save_figure
+from plottools.profiling import Profiler, add_profile_arguments
+from plottools.render import add_reuse_arguments, get_template
+from plottools.style import add_render_arguments, interactive, setup_style
+from plottools.traces import scale_traces, select_columns
+from plottools.watch import add_watch_arguments, follow
 
 
 
-def main():    
+def main(argv=None):    
     #------------------------------Argument parsing-------------------------
     p = ArgumentParser(description = 
                        "This script allows to plot traces imported from .csv files. The .csv file is \
@@ -24,7 +32,8 @@ def main():
                         The program supports basic on-the-fly processing of the traces: for example, the \
                         user can choose whether to plot all the points in each trace or just part of them, \
                         or it can decide to treat the first column of the .csv file as either x data or y \
-                        data.")
+                        data. Virtuoso exports with an x/y column pair per signal are \
+                        also supported: each signal is plotted against its own x data.")
     
     p.add_argument("filename", 
                    type=str, 
@@ -71,7 +80,8 @@ def main():
                         will assume that column 0 of the .csv  also represents y data \
                         and the selected columns will be plotted against the number of \
                         samples. If an index is specified more than once the extra \
-                        occurrences are ignored.")
+                        occurrences are ignored. For Virtuoso exports with an x/y column \
+                        pair per signal, the indices select the signals, starting from 1.")
     p.add_argument("-f",
                    "--formatting",
                    type=str,
@@ -132,31 +142,43 @@ def main():
                    type=int,
                    default="15",
                    help="Font size to be used in figure")  
-
-
-    args = p.parse_args()
-
-    plt.rcParams.update({
-    "text.usetex": True,
-    "font.family": "serif",
-    "font.serif": ["Palatino"],
-    "font.size": str(args.fontsize)
-    })
+    p.add_argument("-f32",
+                   "--float32",
+                   action="store_true",
+                   help="Store data in single precision to halve memory usage.")
+    p.add_argument("-nd",
+                   "--nodecimate",
+                   action="store_true",
+                   help="Plot every sample of the traces. By default long traces are reduced \
+                        to the minimum and maximum of each pixel column of the saved figure, \
+                        which keeps peaks and glitches visible but drops the markers of the \
+                        samples in between.")
+    add_render_arguments(p)
+    add_cache_arguments(p)
+    add_output_arguments(p)
+    add_profile_arguments(p)
+    add_watch_arguments(p)
+    add_reuse_arguments(p)
+
+
+    args = p.parse_args(argv)
+    profiler = Profiler.from_args(args, "basic_plot", file=args.filename)
     #-----------------------------------------------------------------------
 
     #----------------------Generate file paths and import-------------------
     file = args.filename    
+    profiler.stage("load")
 
     try:
-        data = np.genfromtxt(file, delimiter=",", dtype=np.double, skip_header=1)
+        num_data_cols = count_columns(file)
+        paired = is_paired(file)
     except FileNotFoundError as e:
         raise FileNotFoundError("Could not open csv file. Check that it exists and/or you have permission to read it.")
 
-    # Remove header
-    # _, data = data[0], data[1:]
-
-    # Extract number of columns
-    num_data_cols = data.shape[1]
+    # Virtuoso "export all traces" files have an x/y column pair per signal.
+    # Signals are numbered from 1, as if they shared the x data in column 0
+    if paired:
+        num_data_cols = num_data_cols//2 + 1
     #-----------------------------------------------------------------------
 
     #----------------------Save arguments into variables--------------------
@@ -172,7 +194,7 @@ def main():
     if args.stop is not None:
         stop_index = args.stop + 1
     else:
-        stop_index = data.shape[0]
+        stop_index = None
 
     # Manage legend names
     if args.legend is not None:
@@ -194,8 +216,31 @@ If you want to plot it rerun the script with the option --columns 0 or -c 0.")
         raise ValueError("Option -c: The number of selcted columns must be less or equal than the number \
 of columns in the .csv file.")
 
-    if np.any(col_indices[col_indices > num_data_cols]) or np.any(col_indices[col_indices < 0]):
+    if np.any(col_indices >= num_data_cols) or np.any(col_indices < 0):
         raise ValueError("Option -c: one (or more) of the specified indices is invalid.")
+
+    if paired and 0 in col_indices:
+        raise ValueError("Option -c: the .csv file has an x/y column pair per signal, signals are numbered from 1.")
+
+    if paired and args.watch:
+        raise ValueError("Option --watch: files with an x/y column pair per signal are not supported.")
+
+    if args.watch and (start_index < 0 or (stop_index is not None and stop_index < 0)):
+        raise ValueError("Option --watch: start and stop must be non-negative while the file grows.")
+
+    # Only the selected columns (plus the x data, if used) and rows are parsed
+    use_x = 0 not in col_indices
+    load_cols = np.concatenate(([0], col_indices)) if use_x else col_indices
+    if paired:
+        # Each signal is loaded with its own x data and length
+        signals = load_signals(file, col_indices - 1, start=start_index, stop=stop_index, float32=args.float32)
+    elif args.watch:
+        # The file is still growing: it is read incrementally and not cached
+        reader = TailReader(file, columns=load_cols, float32=args.float32, skip_header=1)
+        data = reader.read()
+    else:
+        data = load_traces(file, columns=load_cols, start=start_index, stop=stop_index,
+                           float32=args.float32, skip_header=1, cache=args.cache)
     
 
     # Manage scaling factor for each trace
@@ -203,9 +248,9 @@ of columns in the .csv file.")
         if len(args.ymultipliers) != num_y_cols:
             raise ValueError("Option -m: the number of ymultipliers that are specified must coincide with \
 the number of traces to be plotted.")
-        ymultipliers = np.expand_dims(np.array(args.ymultipliers), 0)
+        ymultipliers = args.ymultipliers
     else:
-        ymultipliers = np.ones((1, num_y_cols))
+        ymultipliers = None
 
     # Manage labels
     if len(args.x_labels) == 1:
@@ -232,32 +277,101 @@ the number of traces to be plotted.")
     #-----------------------------------------------------------------------
 
     #-----------------------Extract traces, plot and save-------------------  
-    y = ymultipliers * data[start_index:stop_index, col_indices]
+    profiler.stage("process")
+    # Decimate to the pixel columns of the saved figure. When x data is not
+    # used, the traces are plotted against the sample indices
+    dpi = 600
+    n_buckets = 0 if args.nodecimate else int(args.figsize[0] * dpi)
+
+    def extract(data, inplace):
+        # data only holds the loaded columns: x data (if used) comes first, so
+        # x and y are views of data and nothing is copied here
+        x, y = select_columns(data, np.arange(1, data.shape[1]) if use_x else np.arange(data.shape[1]))
+        if x is not None and args.xmultipliers != 1:
+            x = np.multiply(x, args.xmultipliers, out=x if inplace and x.flags.writeable else None)
+
+        x, y = minmax_decimate(x, y, n_buckets)
+
+        # Scaling a trace does not change which samples are its minima and maxima,
+        # so only the decimated points are scaled. Without decimation y is still
+        # a view of data and is scaled in place, unless data is memory-mapped
+        y = scale_traces(y, ymultipliers, inplace=inplace)
+        return [(x[:, idx], y[:, idx]) for idx in range(y.shape[1])]
+
+    def extract_signals(signals):
+        # Every signal has its own x data and length, so it is decimated on its own
+        traces = []
+        for idx, signal in enumerate(signals):
+            x = signal.x
+            if args.xmultipliers != 1:
+                x = np.multiply(x, args.xmultipliers, out=x)
+            x, y = minmax_decimate(x, signal.y[:, np.newaxis], n_buckets)
+            y = scale_traces(y, None if ymultipliers is None else [ymultipliers[idx]], inplace=True)
+            traces.append((x[:, 0], y[:, 0]))
+        return traces
+
+    # In --watch mode only the decimated traces are kept: every update
+    # decimates the appended rows and merges them into the existing buckets
+    def watch_rows(rows):
+        nonlocal rows_seen
+        first, rows_seen = rows_seen, rows_seen + rows.shape[0]
+        rows = rows[max(start_index - first, 0):None if stop_index is None else max(stop_index - first, 0)]
+        x, y = select_columns(rows, np.arange(1, rows.shape[1]) if use_x else np.arange(rows.shape[1]))
+        if x is not None and args.xmultipliers != 1:
+            x = np.multiply(x, args.xmultipliers, out=x)
+        decimator.update(x, scale_traces(y, ymultipliers, inplace=True))
+        x, y = decimator.result()
+        return [(x[:, idx], y[:, idx]) for idx in range(y.shape[1])]
+
+    if paired:
+        traces = extract_signals(signals)
+    elif args.watch:
+        decimator = StreamingDecimator(n_buckets)
+        rows_seen = 0
+        traces = watch_rows(data)
+    else:
+        traces = extract(data, inplace=True)
 
     n_axes = num_y_cols if use_axes else 1
 
-    fig, axes = plt.subplots(n_axes, figsize=args.figsize, sharex=False)
-    
-    if not use_axes:    
-        axes = [axes]
+    profiler.stage("plot")
+    plt = setup_style(args.render, args.fontsize)
+
+    def build():
+        fig, axes = plt.subplots(n_axes, figsize=args.figsize, sharex=False)
+        
+        if not use_axes:    
+            axes = [axes]
 
-    for idx, trace in enumerate(y.transpose()):
-        try:
-            formatting = f"{args.formatting[idx]}" if args.formatting is not None else ''
-        except IndexError:
-            formatting = ''
+        lines = []
+        for idx, (x, y) in enumerate(traces):
+            try:
+                formatting = f"{args.formatting[idx]}" if args.formatting is not None else ''
+            except IndexError:
+                formatting = ''
 
-        if 0 not in col_indices:
-            x = args.xmultipliers * data[start_index:stop_index, 0]
             if use_axes:
-                axes[idx].plot(x, trace, formatting, linewidth=args.linewidth)
+                lines += axes[idx].plot(x, y, formatting, linewidth=args.linewidth)
             else:
-                axes[0].plot(x, trace, formatting, linewidth=args.linewidth)
-        else:
-            if use_axes:
-                axes[idx].plot(trace, formatting, linewidth=args.linewidth)
-            else:
-                axes[0].plot(trace, formatting, linewidth=args.linewidth)
+                lines += axes[0].plot(x, y, formatting, linewidth=args.linewidth)
+
+        return fig, (axes, lines)
+
+    # A figure shown on screen or updated by --watch is never reused
+    reuse = args.reuse and not interactive(args.render) and not args.watch
+    if reuse:
+        key = ("basic_plot", args.render, args.fontsize, tuple(args.figsize), n_axes, num_y_cols,
+               tuple(args.formatting or ()), args.linewidth, args.legend is not None, args.legendpos)
+        template, new = get_template(key, build)
+        fig, (axes, lines) = template.fig, template.artists
+        if not new:
+            for line, (x, y) in zip(lines, traces):
+                line.set_data(x, y)
+            for ax in axes:
+                ax.relim()
+                ax.autoscale_view()
+    else:
+        fig, (axes, lines) = build()
 
     # #add legend if necessary
     for ax, xlab, ylab  in zip(axes, xlabels, ylabels):
@@ -271,17 +385,44 @@ the number of traces to be plotted.")
         axes[0].legend(formatted_legend_names, loc = args.legendpos)
 
     #clean whitespace padding
-    fig.tight_layout()
+    profiler.stage("layout")
+    if reuse:
+        template.layout()
+    else:
+        fig.tight_layout()
 
-    savepath = f"{args.filename[0:-4]}{args.extension}"
+    profiler.stage("save")
+    savepath = f"{output_base(args.filename)}{args.extension}"
     try:
-        fig.savefig(savepath, dpi = 600)
+        save_figure(fig, savepath, dpi, **output_options(args))
     except:
         print("Couldn't save figure to specified path. Check savepath and make sure it exists.")
+    profiler.finish()
+
+    # Follow the file and update the existing lines with the appended rows
+    if args.watch:
+        def update(rows):
+            for line, (x, y) in zip(lines, watch_rows(rows)):
+                line.set_data(x, y)
+            for ax in axes:
+                ax.relim()
+                ax.autoscale_view()
+
+            if interactive(args.render):
+                fig.canvas.draw_idle()
+            else:
+                save_figure(fig, savepath, dpi, **output_options(args))
+
+        if interactive(args.render):
+            follow(reader, update, args.refresh, args.idletimeout,
+                   pause=plt.pause, alive=lambda: plt.fignum_exists(fig.number))
+        else:
+            follow(reader, update, args.refresh, args.idletimeout)
 
     # Show figure before exiting
     # Add log that warns user to close the figure
-    plt.show(block=True) 
+    if interactive(args.render):
+        plt.show(block=True) 
     #-----------------------------------------------------------------------
     
     
@@ -0,0 +1,186 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Batch driver that runs one of the plottools scripts on many .csv files
+with the same set of options, spreading the files over a pool of processes.
+"""
+
+import io
+import os
+import sys
+import glob
+import time
+import warnings
+import importlib
+import contextlib
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from plottools.render import close_figures
+
+
+
+SCRIPTS = ("basic_plot", "fourier", "histogr", "rms_discr")
+
+
+
+def init_worker():
+    """Prepare a worker process: figures are never shown and every process
+    uses a single thread for numerical libraries."""
+    os.environ["MPLBACKEND"] = "Agg"
+    for var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(var, "1")
+    warnings.filterwarnings("ignore", message=".*non-interactive.*")
+
+
+
+def run_file(script, filename, options):
+    """Run the main() of script on filename in the current process.
+
+    Returns (filename, elapsed time in seconds, error message or None, output).
+    """
+    module = importlib.import_module(f"plottools.{script}")
+    output = io.StringIO()
+    error = None
+
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(output):
+            module.main([filename] + list(options))
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            error = f"exited with status {e.code}"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        # Figures are closed after every file so that memory does not grow,
+        # except the templates kept by scripts run with --reuse
+        if "matplotlib.pyplot" in sys.modules:
+            close_figures()
+    elapsed = time.perf_counter() - start
+
+    return filename, elapsed, error, output.getvalue()
+
+
+
+def collect_files(patterns, manifest):
+    """Expand glob patterns and read the manifest (one path per line), keeping
+    the order and dropping duplicates."""
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True))
+        files.extend(matches if matches else [pattern])
+
+    if manifest is not None:
+        with open(manifest, "r") as f:
+            files.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+
+    return list(dict.fromkeys(files))
+
+
+
+def main(argv=None):
+    #------------------------------Argument parsing-------------------------
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if "--" in argv:
+        split = argv.index("--")
+        argv, options = argv[:split], argv[split+1:]
+    else:
+        options = []
+
+    p = ArgumentParser(description =
+                       "This script runs one of the plottools scripts on many .csv files with \
+                        the same options, using a pool of processes. Options for the script are \
+                        passed after --, e.g. plot_batch basic_plot 'runs/*.csv' -j 8 -- -rp fast. \
+                        Figures are never shown.")
+
+    p.add_argument("script",
+                   type=str,
+                   choices=SCRIPTS,
+                   help="Script to be run on every file")
+    p.add_argument("files",
+                   type=str,
+                   nargs="*",
+                   help="Files or glob patterns (quoted to avoid shell expansion)")
+    p.add_argument("-m",
+                   "--manifest",
+                   type=str,
+                   default=None,
+                   help="Text file with one .csv path per line")
+    p.add_argument("-j",
+                   "--jobs",
+                   type=int,
+                   default=os.cpu_count(),
+                   help="Number of worker processes. Default is the number of CPUs")
+    p.add_argument("-r",
+                   "--report",
+                   type=str,
+                   default=None,
+                   help="Save per-file timing and errors to the specified .csv file")
+    p.add_argument("-v",
+                   "--verbose",
+                   action="store_true",
+                   help="Print the output of the script for every file")
+
+    args = p.parse_args(argv)
+    #-----------------------------------------------------------------------
+
+    files = collect_files(args.files, args.manifest)
+    if not files:
+        print("No files to process.")
+        sys.exit(1)
+
+    jobs = max(1, min(args.jobs, len(files)))
+    print(f"Running {args.script} on {len(files)} files with {jobs} processes")
+
+    #-----------------------------Run the pool------------------------------
+    results = []
+    start = time.perf_counter()
+
+    def report(result):
+        filename, elapsed, error, output = result
+        status = "ok" if error is None else "FAILED"
+        print(f"{status:6s} {elapsed:8.3f} s  {filename}" + (f"  ({error})" if error else ""))
+        if args.verbose and output:
+            print(output.rstrip())
+        results.append(result)
+
+    if jobs == 1:
+        init_worker()
+        for filename in files:
+            report(run_file(args.script, filename, options))
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker) as pool:
+            futures = [pool.submit(run_file, args.script, filename, options) for filename in files]
+            for future in as_completed(futures):
+                report(future.result())
+
+    wall_time = time.perf_counter() - start
+    #-----------------------------------------------------------------------
+
+    #-----------------------------Summary-----------------------------------
+    failed = [result for result in results if result[2] is not None]
+    cpu_time = sum(result[1] for result in results)
+    print(f"\n{len(results) - len(failed)} succeeded, {len(failed)} failed")
+    print(f"Wall time {wall_time:.3f} s, sum of per-file times {cpu_time:.3f} s "
+          f"(speedup {cpu_time/wall_time if wall_time > 0 else 0:.1f}x)")
+
+    if args.report is not None:
+        with open(args.report, "w") as f:
+            f.write("file,seconds,error\n")
+            for filename, elapsed, error, _ in results:
+                error = "" if error is None else '"' + error.replace('"', "'") + '"'
+                f.write(f"{filename},{elapsed:.6f},{error}\n")
+
+    if failed:
+        sys.exit(1)
+    #-----------------------------------------------------------------------
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Binary sidecar cache for parsed .csv files. Parsed data is stored as .npy
+files in a cache directory and memory-mapped on later runs, so that the same
+.csv is parsed only once.
+
+Entries are keyed by the content hash of the .csv file. The hash itself is
+remembered per (path, size, mtime), so unchanged files are not re-hashed.
+The cache is bounded in size: least recently used entries and hashes are
+evicted first.
+
+Results computed by the scripts (spectra, metrics, histograms...) are
+cached too, as .npz files keyed by the content hash of the input files and
+by the parameters that affect the computation, so that changing only how
+they are presented (labels, positions, figure size...) does not recompute
+them. Results share the size limit and the eviction order of parsed data.
+
+The cache directory and its size can be set with the PLOTTOOLS_CACHE_DIR and
+PLOTTOOLS_CACHE_SIZE (bytes) environment variables.
+"""
+
+import io
+import os
+import json
+import struct
+import zipfile
+import hashlib
+import tempfile
+import numpy as np
+
+
+
+DEFAULT_CACHE_SIZE = 4 * 1024**3
+HASH_BLOCK_SIZE = 1024**2
+# Number of columns transposed at a time when storing column-major entries
+COLUMN_BLOCK_SIZE = 64
+# Part of the keys of cached results: increase it when a change of the code
+# changes the results, so that old entries are not used
+RESULTS_VERSION = 3
+
+
+
+def add_cache_arguments(p, results=None):
+    """Add the cache options to an ArgumentParser. results describes the
+    results the script can keep in the result cache, e.g. "the rms values";
+    if None the script has no result cache and only --cache is added."""
+    p.add_argument("-ca",
+                   "--cache",
+                   action="store_true",
+                   help="Keep the parsed .csv file in a binary cache and memory-map it on later \
+                        runs. The first run parses the whole file to fill the cache.")
+    if results is not None:
+        p.add_argument("-rc",
+                       "--resultcache",
+                       action="store_true",
+                       help=f"Take {results} from the cache of results of previous runs on the same \
+                            data with the same parameters, and store them there. The input files \
+                            are hashed once per path, size and modification time.")
+
+
+
+def cache_dir():
+    """Return the cache directory, creating it if needed."""
+    path = os.environ.get("PLOTTOOLS_CACHE_DIR",
+                          os.path.join(os.environ.get("XDG_CACHE_HOME", os.path.expanduser("~/.cache")), "plottools"))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+
+def cache_size():
+    """Return the maximum size of the cache in bytes."""
+    return int(os.environ.get("PLOTTOOLS_CACHE_SIZE", DEFAULT_CACHE_SIZE))
+
+
+
+def file_digest(filename):
+    """Return the content hash of a file. The result is remembered for the
+    current path, size and mtime of the file."""
+    stat = os.stat(filename)
+    stat_key = f"{os.path.abspath(filename)}|{stat.st_size}|{stat.st_mtime_ns}"
+    stat_file = os.path.join(cache_dir(), hashlib.sha1(stat_key.encode()).hexdigest() + ".key")
+
+    try:
+        with open(stat_file, "r") as f:
+            digest = f.read().strip()
+        # mtime tracks the last access and drives the eviction order
+        os.utime(stat_file)
+        return digest
+    except OSError:
+        pass
+
+    digest = hashlib.blake2b(digest_size=20)
+    with open(filename, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    digest = digest.hexdigest()
+
+    _atomic_write(stat_file, lambda f: f.write(digest.encode()))
+    return digest
+
+
+
+def entry_path(digest, *params):
+    """Return the path of the cache entry for a content hash and the parameters
+    that were used to produce the data."""
+    suffix = "-".join(str(param) for param in params)
+    return os.path.join(cache_dir(), f"{digest}-{suffix}.npy")
+
+
+
+def load(path):
+    """Memory-map a cache entry. Returns None if the entry does not exist."""
+    try:
+        data = np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+
+    # mtime tracks the last access and drives the eviction order
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+    return data
+
+
+
+def store(path, data, fortran_order=False):
+    """Save data to a cache entry, evict old entries and return the entry memory-mapped.
+
+    If fortran_order is True a 2-D array is stored column-major, so that each
+    column of the memory-mapped entry is contiguous on disk and reading a few
+    columns does not touch the others.
+    """
+    if fortran_order and data.ndim == 2 and not data.flags.f_contiguous:
+        _atomic_write(path, lambda f: _write_columns(f, data))
+    else:
+        _atomic_write(path, lambda f: np.save(f, data))
+    evict(cache_size())
+    return load(path)
+
+
+
+def store_chunks(path, chunks, shape, dtype):
+    """Save a 2-D array of the given shape column-major to a cache entry, from
+    the iterable chunks holding a block of its rows each.
+
+    This is a generator: every chunk is yielded after it has been written, so
+    the caller can use the data while the entry is filled, and the whole array
+    is never held in memory. shape is an upper bound of the number of rows:
+    if fewer rows arrive, the entry is shrunk to them. The entry is moved in
+    place, and old entries evicted, once all the chunks have been written. If
+    more rows arrive or the caller stops early, nothing is stored. Write
+    errors are ignored.
+    """
+    dtype = np.dtype(dtype)
+    n_rows, n_cols = shape
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    except OSError:
+        yield from chunks
+        return
+
+    complete = False
+    try:
+        with os.fdopen(fd, "w+b") as f:
+            np.lib.format.write_array_header_1_0(f, {"descr": np.lib.format.dtype_to_descr(dtype),
+                                                     "fortran_order": True,
+                                                     "shape": (n_rows, n_cols)})
+            offset = f.tell()
+            writing = True
+            row = 0
+            for chunk in chunks:
+                if writing and chunk.shape[1] == n_cols and row + chunk.shape[0] <= n_rows:
+                    try:
+                        for col in range(n_cols):
+                            f.seek(offset + (col*n_rows + row) * dtype.itemsize)
+                            f.write(np.ascontiguousarray(chunk[:, col], dtype=dtype).tobytes())
+                    except OSError:
+                        writing = False
+                else:
+                    writing = False
+                row += chunk.shape[0]
+                yield chunk
+            if writing and row < n_rows:
+                try:
+                    _shrink_columns(f, offset, n_rows, n_cols, row, dtype)
+                except OSError:
+                    writing = False
+            complete = writing
+        if complete:
+            try:
+                os.replace(tmp_path, path)
+                evict(cache_size())
+            except OSError:
+                complete = os.path.exists(path)
+    finally:
+        if not complete:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+
+def result_path(name, files, params):
+    """Return the path of the cache entry for the results called name computed
+    from the content of files with params, a dict holding only the parameters
+    that affect the results."""
+    key = json.dumps({"name": name,
+                      "version": RESULTS_VERSION,
+                      "files": [file_digest(filename) for filename in files],
+                      "params": params}, sort_keys=True, default=str)
+    return os.path.join(cache_dir(), f"{name}-{hashlib.blake2b(key.encode(), digest_size=20).hexdigest()}.npz")
+
+
+
+def load_result(path):
+    """Load a cached result as a dict of arrays. Returns None if the entry does
+    not exist or cannot be read."""
+    try:
+        with np.load(path) as entry:
+            result = {name: entry[name] for name in entry.files}
+    except (OSError, ValueError, EOFError, zipfile.BadZipFile):
+        return None
+
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+    return result
+
+
+
+def store_result(path, result):
+    """Save a dict of arrays to a cache entry and evict old entries."""
+    _atomic_write(path, lambda f: np.savez(f, **result))
+    evict(cache_size())
+
+
+
+def cached_result(name, files, params, compute, enabled=True):
+    """Return the result of compute(), a dict of arrays, taking it from the
+    cache if it was already computed from the same files and params (see
+    result_path). If enabled is False the cache is bypassed. Errors of the
+    cache itself are ignored and the result is computed.
+    """
+    if not enabled:
+        return compute()
+
+    try:
+        path = result_path(name, files, params)
+    except OSError:
+        return compute()
+
+    result = load_result(path)
+    if result is None:
+        result = compute()
+        try:
+            store_result(path, result)
+        except OSError:
+            pass
+
+    return result
+
+
+
+def evict(max_bytes):
+    """Delete the least recently used entries until the cache is smaller than max_bytes.
+
+    The remembered hashes of files (.key) are evicted like the entries. Sizes
+    are those taken on disk, so that the many tiny .key files count too.
+    """
+    directory = cache_dir()
+    entries = []
+    for name in os.listdir(directory):
+        if not name.endswith((".npy", ".npz", ".key")):
+            continue
+        try:
+            stat = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        size = stat.st_blocks * 512 if hasattr(stat, "st_blocks") else stat.st_size
+        entries.append((stat.st_mtime, size, name))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            continue
+        total -= size
+
+
+
+def _shrink_columns(f, offset, n_rows, n_cols, rows, dtype):
+    # Turn a column-major entry allocated for n_rows rows, whose data starts
+    # at offset, into one holding only its first rows: the columns are moved
+    # down a block at a time, the file is truncated and the header rewritten
+    block = max(HASH_BLOCK_SIZE // dtype.itemsize, 1)
+    for col in range(1, n_cols):
+        for first in range(0, rows, block):
+            count = min(block, rows - first)
+            f.seek(offset + (col*n_rows + first) * dtype.itemsize)
+            data = f.read(count * dtype.itemsize)
+            f.seek(offset + (col*rows + first) * dtype.itemsize)
+            f.write(data)
+    f.truncate(offset + rows*n_cols * dtype.itemsize)
+
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, {"descr": np.lib.format.dtype_to_descr(dtype),
+                                                  "fortran_order": True,
+                                                  "shape": (rows, n_cols)})
+    header = header.getvalue()
+    if len(header) < offset:
+        # Fewer digits in the shape: pad the header to its old length with
+        # spaces before the final newline, and update its length field
+        text = header[10:-1] + b" " * (offset - len(header))
+        header = header[:8] + struct.pack("<H", len(text) + 1) + text + b"\n"
+    f.seek(0)
+    f.write(header)
+
+
+
+def _write_columns(f, data):
+    # Equivalent to np.save of np.asfortranarray(data), but transposes a block
+    # of columns at a time instead of copying the whole array
+    header = {"descr": np.lib.format.dtype_to_descr(data.dtype),
+              "fortran_order": True,
+              "shape": data.shape}
+    np.lib.format.write_array_header_1_0(f, header)
+    for first in range(0, data.shape[1], COLUMN_BLOCK_SIZE):
+        f.write(np.ascontiguousarray(data[:, first:first+COLUMN_BLOCK_SIZE].T).tobytes())
+
+
+
+def _atomic_write(path, write):
+    # Write to a temporary file and move it in place, so that concurrent runs
+    # never see partially written entries
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w+b") as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
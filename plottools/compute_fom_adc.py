@@ -1,15 +1,30 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 
+import os
+import sys
 import numpy as np
 from argparse import ArgumentParser
+from plottools.cache import add_cache_arguments, load_result, result_path, store_result
+from plottools.csvio import count_columns, iter_traces, load_traces
+from plottools.fom import KeyIndex, schreier_fom, walden_fom
+from plottools.profiling import Profiler, add_profile_arguments
 
 
 
-def main():
+def default_column(file):
+    """Column with the values of a .csv file when it is not specified: the
+    second one if the file has more than one column, otherwise the first."""
+    return 1 if count_columns(file) > 1 else 0
+
+
+
+def main(argv=None):
     p = ArgumentParser(description = 
                        "This script computes the Walden FOM under mismatch+process starting\
-                       from Montecarlo data of SNDR and power consumption.")
+                       from Montecarlo data of SNDR and power consumption. Runs can be matched \
+                       through an ID column present in both files, otherwise they are paired \
+                       by position and the two files must have the same number of runs.")
     
     p.add_argument("sndr_file", 
                    type = str, 
@@ -18,38 +33,179 @@ def main():
     p.add_argument("pwr_file", 
                    type = str, 
                    help = "name of the .csv file containing power consumption data.")        
-
-    args = p.parse_args() 
+    add_cache_arguments(p, "the FOMs")
+    p.add_argument("-fs",
+                   "--fsample",
+                   type=float,
+                   default=200e6,
+                   help="Sampling frequency in Hz. Default value is 200e6")
+    p.add_argument("-bw",
+                   "--bandwidth",
+                   type=float,
+                   default=None,
+                   help="Signal bandwidth in Hz. Default is fsample/2")
+    p.add_argument("-k",
+                   "--key",
+                   type=int,
+                   default=None,
+                   help="Index of the run/point ID column, used in both files to match the runs.")
+    p.add_argument("-sc",
+                   "--sndrcolumn",
+                   type=int,
+                   default=None,
+                   help="Index of the SNDR column. Default is 1, or 0 for single-column files")
+    p.add_argument("-pc",
+                   "--pwrcolumn",
+                   type=int,
+                   default=None,
+                   help="Index of the power column. Default is 1, or 0 for single-column files")
+    p.add_argument("-sf",
+                   "--schreier",
+                   action="store_true",
+                   help="Also compute the Schreier FOM.")
+    p.add_argument("-o",
+                   "--output",
+                   type=str,
+                   default="fom_v12c.csv",
+                   help="Output .csv file. Default is fom_v12c.csv")
+    p.add_argument("-cs",
+                   "--chunksize",
+                   type=int,
+                   default=1000000,
+                   help="Number of SNDR rows processed at a time. Default value is 1000000")
+
+    add_profile_arguments(p)
+
+
+    args = p.parse_args(argv) 
+    profiler = Profiler.from_args(args, "compute_fom_adc", files=[args.sndr_file, args.pwr_file])
 
     sndr_file = args.sndr_file
     pwr_file = args.pwr_file
-    
-    sndr_data = np.genfromtxt(sndr_file, delimiter=',')
-    pwr_data = np.genfromtxt(pwr_file, delimiter=',')
-
-    which_column_sndr = 1
-    which_column_pwr = 1
-
-    if sndr_data.shape != (sndr_data.shape[0],):
-        sndr_data = np.transpose(sndr_data.transpose()[which_column_sndr])
-
-    if pwr_data.shape != (pwr_data.shape[0],):
-        pwr_data = pwr_data[1:][:]
-        pwr_data = np.transpose(pwr_data.transpose()[which_column_pwr])
-
-
-    fom_data = np.zeros_like(sndr_data)
-    sampling_frequ = 200e6
-
-    for idx, (sndr, power_consumption) in enumerate(zip(sndr_data, pwr_data)):
-        enob = (sndr - 1.76)/6
-        fom_data[idx] = power_consumption/(pow(2,enob) * sampling_frequ)        
-    
-
-    savepath = "fom_v12c.csv"
-    np.savetxt(savepath, fom_data, delimiter=',')
+    cache = args.cache
+
+    try:
+        which_column_sndr = args.sndrcolumn if args.sndrcolumn is not None else default_column(sndr_file)
+        which_column_pwr = args.pwrcolumn if args.pwrcolumn is not None else default_column(pwr_file)
+    except OSError as e:
+        print("Error: ", e)
+        sys.exit(1)
+
+    # Output columns: ID (if used), Walden FOM and optionally Schreier FOM
+    names = (["id"] if args.key is not None else []) + ["walden"] + (["schreier"] if args.schreier else [])
+
+    def fom_columns(sndr, power):
+        columns = [walden_fom(sndr, power, args.fsample, args.bandwidth)]
+        if args.schreier:
+            columns.append(schreier_fom(sndr, power, args.fsample, args.bandwidth))
+        return columns
+
+    #-------------------------Join and compute chunk by chunk---------------
+    # With --resultcache, FOMs of previous runs on the same files with the same
+    # parameters are taken from the result cache, otherwise they are collected while they are
+    # written so that they can be stored
+    path = cached = None
+    if args.resultcache:
+        params = {"fsample": args.fsample, "bandwidth": args.bandwidth, "key": args.key,
+                  "sndrcolumn": which_column_sndr, "pwrcolumn": which_column_pwr, "schreier": args.schreier}
+        try:
+            path = result_path("compute_fom_adc", [sndr_file, pwr_file], params)
+            cached = load_result(path)
+        except OSError:
+            path = None
+
+    try:
+        out = open(args.output, "w")
+    except OSError as e:
+        print("Error: ", e)
+        sys.exit(1)
+
+    # IDs are written as integers, FOMs at full precision
+    fmt = (["%d"] if args.key is not None else []) + ["%.18e"] * (len(names) - (args.key is not None))
+    blocks = []
+    error = None
+    with out:
+        if len(names) > 1:
+            out.write(",".join(names) + "\n")
+
+        try:
+            if cached is not None:
+                profiler.stage("process")
+                np.savetxt(out, cached["fom"], delimiter=",", fmt=fmt)
+                for message in cached["messages"]:
+                    print(message)
+            elif args.key is not None:
+                # Hash join: the power table is indexed by ID, SNDR rows are streamed and probed
+                profiler.stage("load")
+                pwr_data = load_traces(pwr_file, columns=[args.key, which_column_pwr], skip_header=None, cache=cache)
+                index = KeyIndex(pwr_data[:, 0], pwr_data[:, 1])
+                messages = []
+                if index.duplicates:
+                    messages.append(f"Warning: {index.duplicates} duplicate IDs in {pwr_file}, the last occurrence is used.")
+
+                n_matched = n_missing = 0
+                profiler.stage("process")
+                for chunk in iter_traces(sndr_file, args.chunksize, columns=[args.key, which_column_sndr],
+                                         skip_header=None, cache=cache):
+                    found, power = index.lookup(chunk[:, 0])
+                    keys, sndr = chunk[found, 0], chunk[found, 1]
+                    block = np.column_stack([keys] + fom_columns(sndr, power))
+                    np.savetxt(out, block, delimiter=",", fmt=fmt)
+                    if path is not None:
+                        blocks.append(block)
+                    n_matched += int(np.count_nonzero(found))
+                    n_missing += int(np.count_nonzero(~found))
+
+                if n_missing:
+                    messages.append(f"Warning: {n_missing} runs of {sndr_file} have no power data in {pwr_file} and were skipped.")
+                messages.append(f"{n_matched} runs matched.")
+                for message in messages:
+                    print(message)
+            else:
+                # Runs are paired by position, both files are streamed side by side
+                profiler.stage("process")
+                sndr_chunks = iter_traces(sndr_file, args.chunksize, columns=[which_column_sndr], skip_header=None, cache=cache)
+                pwr_chunks = iter_traces(pwr_file, args.chunksize, columns=[which_column_pwr], skip_header=None, cache=cache)
+                messages = []
+                n_sndr = n_pwr = 0
+                # Chunks are pulled from each file on its own, so that the runs
+                # left in either file when the other one ends are all counted
+                while True:
+                    sndr = next(sndr_chunks, None)
+                    power = next(pwr_chunks, None)
+                    if sndr is None or power is None:
+                        break
+                    n_sndr += len(sndr)
+                    n_pwr += len(power)
+                    n = min(len(sndr), len(power))
+                    block = np.column_stack(fom_columns(sndr[:n, 0], power[:n, 0]))
+                    np.savetxt(out, block, delimiter=",", fmt=fmt)
+                    if path is not None:
+                        blocks.append(block)
+                n_sndr += (len(sndr) if sndr is not None else 0) + sum(len(chunk) for chunk in sndr_chunks)
+                n_pwr += (len(power) if power is not None else 0) + sum(len(chunk) for chunk in pwr_chunks)
+
+                if n_sndr != n_pwr:
+                    error = f"{sndr_file} has {n_sndr} runs but {pwr_file} has {n_pwr}. " \
+                            "Use --key to match the runs by ID."
+        except (OSError, ValueError) as e:
+            error = e
+
+    if error is None and cached is None and path is not None:
+        try:
+            fom = np.concatenate(blocks) if blocks else np.empty((0, len(names)))
+            store_result(path, {"fom": fom, "messages": np.array(messages, dtype=str)})
+        except OSError:
+            pass
+
+    if error is not None:
+        os.remove(args.output)
+        print("Error: ", error)
+        sys.exit(1)
+    profiler.finish()
+    #-----------------------------------------------------------------------
 
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,562 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Shared .csv ingest layer used by all the plottools scripts. Parsing is done
+by the C tokenizer behind np.loadtxt, with column projection and row-range
+pushdown so that only the requested part of the file is converted.
+
+Two layouts are supported: traces sharing the x data in column 0, and the
+Virtuoso "export all traces" layout with an x/y column pair per signal (see
+is_paired and load_signals).
+
+Files compressed with gzip, xz, bzip2 or zstandard (the latter needs the
+zstandard package) are read transparently: they are decompressed as a
+stream, in a separate thread that overlaps with parsing, so the whole
+decompressed text is never held in memory.
+"""
+
+import io
+import os
+import re
+import queue
+import itertools
+import threading
+import contextlib
+import numpy as np
+from collections import namedtuple
+from plottools import cache
+from plottools.traces import column_index
+
+
+
+# First bytes of the supported compressed formats
+COMPRESSION_MAGIC = ((b"\x1f\x8b", "gzip"), (b"\xfd7zXZ\x00", "xz"), (b"BZh", "bz2"), (b"\x28\xb5\x2f\xfd", "zstd"))
+COMPRESSED_EXTENSIONS = (".gz", ".xz", ".lzma", ".bz2", ".zst")
+
+# Bytes decompressed at a time by the decompression thread, and number of
+# decompressed blocks it can get ahead of the parser
+DECOMPRESS_BLOCK_SIZE = 1024**2
+DECOMPRESS_QUEUE_LENGTH = 8
+
+# Rows parsed at a time when a file is stored in the cache by load_traces, and
+# bytes read at a time when counting its rows
+CACHE_CHUNK_SIZE = 65536
+COUNT_BLOCK_SIZE = 1024**2
+
+
+
+def compression(filename):
+    """Return the compression format of a file ("gzip", "xz", "bz2" or "zstd"),
+    recognised from its first bytes, or None if it is not compressed."""
+    with open(filename, "rb") as f:
+        magic = f.read(6)
+
+    for prefix, name in COMPRESSION_MAGIC:
+        if magic.startswith(prefix):
+            return name
+    return None
+
+
+
+def output_base(filename):
+    """Return filename without the .csv extension and, for compressed files,
+    the compression one, e.g. to name the figures made from it."""
+    base, ext = os.path.splitext(filename)
+    if ext.lower() in COMPRESSED_EXTENSIONS:
+        base, ext = os.path.splitext(base)
+    return base if ext else filename
+
+
+
+def open_csv(filename, threaded=True):
+    """Open a .csv file for reading as text, decompressing it on the fly if it
+    is compressed (see compression). If threaded, decompression runs in a
+    separate thread, a few blocks ahead of the reader."""
+    fmt = compression(filename)
+    if fmt is None:
+        return open(filename, "r")
+
+    if fmt == "gzip":
+        import gzip
+        stream = gzip.open(filename, "rb")
+    elif fmt == "xz":
+        import lzma
+        stream = lzma.open(filename, "rb")
+    elif fmt == "bz2":
+        import bz2
+        stream = bz2.open(filename, "rb")
+    else:
+        try:
+            import zstandard
+        except ImportError:
+            raise OSError(f"{filename} is compressed with zstandard: install the zstandard package to read it.")
+        stream = zstandard.ZstdDecompressor().stream_reader(open(filename, "rb"), closefd=True)
+
+    if threaded:
+        stream = io.BufferedReader(_DecompressThread(stream, filename), DECOMPRESS_BLOCK_SIZE)
+    return io.TextIOWrapper(stream)
+
+
+
+def count_columns(filename, delimiter=","):
+    """Return the number of columns of a .csv file by looking at its first line."""
+    with open_csv(filename, threaded=False) as f:
+        line = f.readline()
+
+    return len(line.rstrip("\r\n").split(delimiter))
+
+
+
+def read_header(filename, delimiter=","):
+    """Return the column names in the first line of a .csv file."""
+    with open_csv(filename, threaded=False) as f:
+        line = f.readline()
+
+    return [name.strip() for name in line.rstrip("\r\n").split(delimiter)]
+
+
+
+def has_header(filename, delimiter=","):
+    """Return True if the first line of the .csv file cannot be parsed as numbers."""
+    with open_csv(filename, threaded=False) as f:
+        line = f.readline()
+
+    try:
+        [float(field) for field in line.rstrip("\r\n").split(delimiter) if field.strip()]
+    except ValueError:
+        return True
+
+    return False
+
+
+
+def is_paired(filename, delimiter=","):
+    """Return True if the .csv file has the layout of a Virtuoso "export all
+    traces" file: one x/y column pair per signal, with headers like
+    '/net1 X,/net1 Y,/net2 X,/net2 Y'."""
+    names = [name.upper() for name in read_header(filename, delimiter)]
+
+    return (len(names) >= 2 and len(names) % 2 == 0
+            and all(name.endswith(" X") for name in names[0::2])
+            and all(name.endswith(" Y") for name in names[1::2]))
+
+
+
+Signal = namedtuple("Signal", ["name", "x", "y"])
+
+# Bytes of text parsed at a time by load_signals
+SIGNALS_BLOCK_SIZE = 16 * 1024**2
+
+
+
+def load_signals(filename, signals=None, start=None, stop=None, float32=False, delimiter=","):
+    """Load a .csv file with one x/y column pair per signal (see is_paired).
+
+    Every signal has its own x data and its own length: the shorter ones are
+    padded with empty cells in the file, which are dropped here, so each signal
+    is returned as two contiguous arrays of its own length with no NaN padding.
+
+    signals:        indices of the signals to read, 0 being the first pair.
+                    If None, all signals are read.
+    start, stop:    range of samples of each signal to keep (slice semantics).
+
+    The file is parsed a block of rows at a time by np.loadtxt, after the empty
+    cells of the block have been filled in by a single regular expression, so
+    no Python code runs per cell.
+
+    Returns a list of Signal(name, x, y).
+    """
+    names = read_header(filename, delimiter)
+    if signals is None:
+        signals = range(len(names)//2)
+    signals = [int(sig) for sig in signals]
+    usecols = [col for sig in signals for col in (2*sig, 2*sig + 1)]
+    dtype = np.float32 if float32 else np.double
+
+    # Empty field: after a delimiter and before another one or the end of the
+    # line, or at the beginning of a line and before a delimiter
+    sep = re.escape(delimiter)
+    empty = re.compile(f"(?<={sep})(?=[{sep}\r\n])|(?<![^\n])(?={sep})")
+
+    xs = [[] for _ in signals]
+    ys = [[] for _ in signals]
+    with open_csv(filename) as f:
+        f.readline()
+        while True:
+            lines = f.readlines(SIGNALS_BLOCK_SIZE)
+            if not lines:
+                break
+            text = "".join(lines)
+            if not text.endswith("\n"):
+                text += "\n"
+
+            block = np.loadtxt(io.StringIO(empty.sub("nan", text)), delimiter=delimiter, dtype=dtype,
+                               usecols=usecols, ndmin=2)
+            for idx in range(len(signals)):
+                x, y = block[:, 2*idx], block[:, 2*idx + 1]
+                valid = ~(np.isnan(x) | np.isnan(y))
+                xs[idx].append(x[valid])
+                ys[idx].append(y[valid])
+
+    result = []
+    for idx, sig in enumerate(signals):
+        x = np.concatenate(xs[idx]) if xs[idx] else np.empty(0, dtype=dtype)
+        y = np.concatenate(ys[idx]) if ys[idx] else np.empty(0, dtype=dtype)
+        name = names[2*sig][:-2].strip()
+        if start is not None or stop is not None:
+            x, y = x[start:stop].copy(), y[start:stop].copy()
+        result.append(Signal(name, x, y))
+
+    return result
+
+
+
+def load_traces(filename, columns=None, start=None, stop=None, float32=False,
+                skip_header=1, delimiter=",", cache=False):
+    """Load traces stored as columns of a .csv file.
+
+    columns:        indices of the columns to read. The returned array has its
+                    columns in the same order. If None, all columns are read.
+    start, stop:    range of data rows to read (slice semantics, stop excluded,
+                    counted from the first row after the header).
+    float32:        if True data is stored in single precision.
+    skip_header:    number of header lines. If None, a single header line is
+                    skipped only if the first line is not numeric.
+    cache:          if True the whole file is parsed once and stored in the
+                    binary cache (see plottools.cache), later calls memory-map it.
+                    The entry is filled a chunk of rows at a time, so even the
+                    first call does not hold the whole file in memory.
+
+    Returns a 2-D array with one trace per column. With cache, equally spaced
+    columns are returned as a read-only view of the memory-mapped entry.
+    """
+    if skip_header is None:
+        skip_header = 1 if has_header(filename, delimiter) else 0
+
+    dtype = np.float32 if float32 else np.double
+    usecols = None if columns is None else [int(col) for col in columns]
+
+    if cache:
+        path, data = _cache_entry(filename, dtype, skip_header, delimiter)
+        if path is not None and data is None:
+            for _ in _fill_cache(path, filename, dtype, skip_header, delimiter, CACHE_CHUNK_SIZE):
+                pass
+            path, data = _cache_entry(filename, dtype, skip_header, delimiter)
+        if data is not None:
+            data = data[start:stop]
+            return data if usecols is None else data[:, column_index(usecols)]
+
+    # Rows are pushed down to the parser only for non-negative bounds, negative
+    # ones need to know the length of the file and are applied afterwards
+    pushdown = (start is None or start >= 0) and (stop is None or stop >= 0)
+    if pushdown:
+        first_row = start if start is not None else 0
+        max_rows = max(stop - first_row, 0) if stop is not None else None
+    else:
+        first_row = 0
+        max_rows = None
+
+    data = _parse(filename, dtype, skip_header + first_row, max_rows, usecols, delimiter)
+
+    if not pushdown:
+        data = data[start:stop]
+
+    return data
+
+
+
+def iter_traces(filename, chunksize, columns=None, start=None, stop=None, float32=False,
+                skip_header=1, delimiter=",", cache=False):
+    """Read traces from a .csv file in chunks of at most chunksize rows.
+
+    The arguments have the same meaning as in load_traces, but start and stop
+    must be non-negative. Only one chunk is held in memory at a time, so that
+    records of any length can be processed in constant memory.
+
+    Yields 2-D arrays with one trace per column.
+    """
+    if skip_header is None:
+        skip_header = 1 if has_header(filename, delimiter) else 0
+
+    dtype = np.float32 if float32 else np.double
+    usecols = None if columns is None else [int(col) for col in columns]
+    first_row = start if start is not None else 0
+
+    if cache:
+        path, data = _cache_entry(filename, dtype, skip_header, delimiter)
+        if data is not None:
+            data = data[first_row:stop]
+            for begin in range(0, data.shape[0], chunksize):
+                chunk = data[begin:begin+chunksize]
+                yield chunk if usecols is None else chunk[:, column_index(usecols)]
+            return
+        if path is not None:
+            # The whole file is parsed to fill the entry, only the requested
+            # rows and columns are passed on
+            row = 0
+            for chunk in _fill_cache(path, filename, dtype, skip_header, delimiter, chunksize):
+                begin = max(first_row - row, 0)
+                end = chunk.shape[0] if stop is None else min(stop - row, chunk.shape[0])
+                row += chunk.shape[0]
+                if end > begin:
+                    chunk = chunk[begin:end]
+                    yield chunk if usecols is None else chunk[:, column_index(usecols)]
+            return
+
+    max_rows = stop - first_row if stop is not None else None
+    yield from _iter_chunks(filename, chunksize, dtype, skip_header + first_row, max_rows, usecols, delimiter)
+
+
+
+class TailReader:
+    """Incremental reader of a .csv file that is still being written, e.g. by
+    a running simulation. The reader keeps the byte offset of the last
+    complete row it has parsed, so every call of read() only parses the rows
+    appended since the previous call. An incomplete last line is left for the
+    next call. If the file shrinks (it was rewritten), reading starts again
+    from the top.
+
+    The arguments have the same meaning as in load_traces. Compressed files
+    cannot be followed.
+    """
+
+    # Bytes read and parsed at a time, so that the first read of a large file
+    # does not hold all of its text in memory
+    BLOCK_SIZE = 16 * 1024**2
+
+    def __init__(self, filename, columns=None, float32=False, skip_header=1, delimiter=","):
+        if os.path.exists(filename) and compression(filename) is not None:
+            raise ValueError(f"{filename} is compressed, only plain .csv files can be followed while they grow.")
+        self.filename = filename
+        self.dtype = np.float32 if float32 else np.double
+        self.usecols = None if columns is None else [int(col) for col in columns]
+        self.skip_header = skip_header
+        self.delimiter = delimiter
+        self.offset = 0
+        self._header_left = skip_header
+
+
+    def read(self):
+        """Return the complete rows appended since the last call as a 2-D
+        array with one trace per column (possibly with no rows)."""
+        blocks = []
+        with open(self.filename, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < self.offset:
+                self.offset = 0
+                self._header_left = self.skip_header
+            f.seek(self.offset)
+
+            while self.offset < size:
+                block = f.read(min(self.BLOCK_SIZE, size - self.offset))
+                end = block.rfind(b"\n") + 1
+                if end == 0:
+                    if len(block) < self.BLOCK_SIZE:
+                        break
+                    # A single line longer than a block: read on to its end
+                    block += f.readline()
+                    end = len(block) if block.endswith(b"\n") else 0
+                    if end == 0:
+                        break
+                    f.seek(self.offset + end)
+                elif end < len(block):
+                    f.seek(self.offset + end)
+                self.offset += end
+
+                lines = block[:end].decode().splitlines()
+                if self._header_left:
+                    skipped = min(self._header_left, len(lines))
+                    lines = lines[skipped:]
+                    self._header_left -= skipped
+                if lines:
+                    blocks.append(_parse(lines, self.dtype, 0, None, self.usecols, self.delimiter))
+
+        if not blocks:
+            num_cols = len(self.usecols) if self.usecols is not None else count_columns(self.filename, self.delimiter)
+            return np.empty((0, num_cols), dtype=self.dtype)
+
+        return blocks[0] if len(blocks) == 1 else np.concatenate(blocks)
+
+
+
+class _DecompressThread(io.RawIOBase):
+    # Raw stream that reads the decompressed data of stream from a thread,
+    # which decompresses the next blocks while the caller parses the current
+    # one. zlib, lzma, bz2 and zstandard release the GIL while decompressing
+
+    def __init__(self, stream, name):
+        self._stream = stream
+        self._name = name
+        self._queue = queue.Queue(DECOMPRESS_QUEUE_LENGTH)
+        self._stop = threading.Event()
+        self._block = memoryview(b"")
+        self._error = None
+        self._eof = False
+        self._thread = threading.Thread(target=self._decompress, daemon=True)
+        self._thread.start()
+
+
+    def _decompress(self):
+        try:
+            while not self._stop.is_set():
+                block = self._stream.read(DECOMPRESS_BLOCK_SIZE)
+                self._put(block)
+                if not block:
+                    return
+        except Exception as e:
+            self._error = e
+            self._put(b"")
+
+
+    def _put(self, block):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(block, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+
+    def readable(self):
+        return True
+
+
+    def readinto(self, buffer):
+        if not self._block:
+            if self._eof:
+                return 0
+            block = self._queue.get()
+            if not block:
+                self._eof = True
+                if self._error is not None:
+                    raise OSError(f"Could not decompress {self._name}: {self._error}") from self._error
+                return 0
+            self._block = memoryview(block)
+
+        n = min(len(buffer), len(self._block))
+        buffer[:n] = self._block[:n]
+        self._block = self._block[n:]
+        return n
+
+
+    def close(self):
+        if not self.closed:
+            self._stop.set()
+            self._thread.join()
+            self._stream.close()
+        super().close()
+
+
+
+def _text_source(source):
+    # Compressed files are passed to the parsers as decompressed text streams
+    if isinstance(source, str) and compression(source) is not None:
+        return open_csv(source)
+    return contextlib.nullcontext(source)
+
+
+
+def _parse(source, dtype, skiprows, max_rows, usecols, delimiter):
+    # source is either a file name or a list of lines
+    num_cols = len(usecols) if usecols is not None else None
+
+    if max_rows == 0:
+        return np.empty((0, num_cols or _num_columns(source, delimiter)), dtype=dtype)
+
+    try:
+        with _text_source(source) as text:
+            data = np.loadtxt(text,
+                              delimiter=delimiter,
+                              dtype=dtype,
+                              skiprows=skiprows,
+                              max_rows=max_rows,
+                              usecols=usecols,
+                              ndmin=2)
+    except ValueError:
+        # Empty or non-numeric cells: fall back to the slower parser, which
+        # turns them into NaN
+        with _text_source(source) as text:
+            data = np.genfromtxt(text,
+                                 delimiter=delimiter,
+                                 dtype=dtype,
+                                 skip_header=skiprows,
+                                 max_rows=max_rows,
+                                 usecols=usecols)
+        data = np.reshape(data, (-1, num_cols or _num_columns(source, delimiter)))
+
+    return data
+
+
+
+def _num_columns(source, delimiter):
+    if isinstance(source, str):
+        return count_columns(source, delimiter)
+
+    return len(source[0].rstrip("\r\n").split(delimiter))
+
+
+
+def _iter_chunks(filename, chunksize, dtype, skiprows, max_rows, usecols, delimiter):
+    # Parse max_rows rows (all if None) after the first skiprows lines of the
+    # file, chunksize rows at a time
+    with open_csv(filename) as f:
+        for _ in itertools.islice(f, skiprows):
+            pass
+
+        while max_rows is None or max_rows > 0:
+            n_rows = chunksize if max_rows is None else min(chunksize, max_rows)
+            lines = list(itertools.islice(f, n_rows))
+            if not lines:
+                break
+
+            yield _parse(lines, dtype, 0, None, usecols, delimiter)
+
+            if max_rows is not None:
+                max_rows -= len(lines)
+
+
+
+def _count_rows(filename, skip_header):
+    # Number of data rows of a .csv file, from its line breaks
+    lines = 0
+    last = b"\n"
+    with open_csv(filename) as f:
+        for block in iter(lambda: f.buffer.read(COUNT_BLOCK_SIZE), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+
+    return max(lines + (last != b"\n") - skip_header, 0)
+
+
+
+def _cache_entry(filename, dtype, skip_header, delimiter):
+    # Returns the path of the cache entry of the whole file and the entry
+    # memory-mapped, or None if it does not exist yet. The path is None if the
+    # cache cannot be used
+    try:
+        path = cache.entry_path(cache.file_digest(filename), skip_header, np.dtype(dtype).name, ord(delimiter), "F")
+    except OSError:
+        return None, None
+
+    return path, cache.load(path)
+
+
+
+def _fill_cache(path, filename, dtype, skip_header, delimiter, chunksize):
+    # Parse the whole file a chunk at a time and yield the chunks while they
+    # are written to the cache entry at path, column-major so that reading a
+    # few columns only touches their pages. If the number of rows was
+    # miscounted (e.g. blank lines) the entry is not stored
+    chunks = _iter_chunks(filename, chunksize, dtype, skip_header, None, None, delimiter)
+    try:
+        shape = (_count_rows(filename, skip_header), count_columns(filename, delimiter))
+    except OSError:
+        yield from chunks
+        return
+
+    yield from cache.store_chunks(path, chunks, shape, dtype)
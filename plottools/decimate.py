@@ -0,0 +1,217 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Decimation of long traces before plotting.
+"""
+
+import numpy as np
+
+
+
+def minmax_decimate(x, y, n_buckets):
+    """Reduce the traces in y to the minimum and maximum sample of each of
+    n_buckets buckets, so that peaks and glitches survive decimation. The
+    first and last samples are always kept.
+
+    x:          x data shared by all the traces (1-D array) or None to use
+                the sample indices.
+    y:          2-D array with one trace per column.
+    n_buckets:  number of buckets, usually the number of pixel columns the
+                traces are drawn on.
+
+    Returns (x, y) as 2-D arrays with one column per trace. Points are kept
+    in their original order. If the traces are short enough they are
+    returned as they are.
+    """
+    n_samples, n_traces = y.shape
+
+    if n_buckets < 1 or n_samples <= 2 * n_buckets + 2:
+        positions = x if x is not None else np.arange(n_samples)
+        return np.broadcast_to(positions[:, np.newaxis], y.shape), y
+
+    imin, imax = _bucket_extrema(y, -(-n_samples // n_buckets))
+
+    # Interleave min and max of each bucket keeping the original sample order
+    indices = np.stack((np.minimum(imin, imax), np.maximum(imin, imax)), axis=1)
+    indices = indices.reshape(-1, n_traces)
+    first = np.zeros((1, n_traces), dtype=indices.dtype)
+    last = np.full((1, n_traces), n_samples - 1, dtype=indices.dtype)
+    indices = np.vstack((first, indices, last))
+
+    y_dec = np.take_along_axis(y, indices, axis=0)
+    x_dec = x[indices] if x is not None else indices
+
+    return x_dec, y_dec
+
+
+
+def _bucket_extrema(y, bucket_len):
+    # Indices of the minimum and maximum of every bucket of bucket_len samples
+    # of the traces in y, the last bucket possibly partial
+    n_samples, n_traces = y.shape
+    n_full = n_samples // bucket_len
+    offsets = np.arange(n_full)[:, np.newaxis] * bucket_len
+
+    buckets = y[:n_full * bucket_len].reshape(n_full, bucket_len, n_traces)
+    imin = np.argmin(buckets, axis=1) + offsets
+    imax = np.argmax(buckets, axis=1) + offsets
+
+    if n_full * bucket_len < n_samples:
+        tail = y[n_full * bucket_len:]
+        imin = np.vstack((imin, np.argmin(tail, axis=0) + n_full * bucket_len))
+        imax = np.vstack((imax, np.argmax(tail, axis=0) + n_full * bucket_len))
+
+    return imin, imax
+
+
+
+class StreamingDecimator:
+    """Min/max decimation, as in minmax_decimate, of traces whose samples
+    arrive in chunks, e.g. from a file that is still being written.
+
+    Samples are grouped in buckets of bucket_len consecutive samples, of
+    which the minimum and the maximum are kept. Every update only reduces
+    the new samples and merges them into the last bucket. When the record
+    would need more than n_buckets buckets, pairs of buckets are merged and
+    bucket_len doubles, so the work and memory of an update depend on the
+    new samples and on n_buckets, not on the length of the record.
+
+    If n_buckets < 1 all the samples are kept, in buffers that grow by
+    doubling, so appending is still amortised constant time per sample.
+    """
+
+    def __init__(self, n_buckets):
+        self.n_buckets = n_buckets
+        self.bucket_len = 1
+        self.count = 0
+        self.n_traces = 0
+        self._edges = None      # positions and values of the first and last samples
+        self._index = None      # (2, buckets, traces) sample indices of the minima and maxima
+        self._pos = None        # x data at those indices
+        self._val = None        # values at those indices
+        self._x = None          # all the samples, if n_buckets < 1
+        self._y = None
+
+
+    def update(self, x, y):
+        """Add consecutive samples: x is the shared x data (1-D array) or None
+        to use the sample indices, y a 2-D array with one trace per column."""
+        y = np.asarray(y)
+        if y.ndim == 1:
+            y = y[:, np.newaxis]
+        self.n_traces = y.shape[1]
+        n_new = y.shape[0]
+        if n_new == 0:
+            return
+
+        first = self.count
+        positions = x if x is not None else np.arange(first, first + n_new)
+        self.count += n_new
+
+        if self.n_buckets < 1:
+            self._append(positions, y, first)
+            return
+
+        if self._edges is None:
+            self._edges = [positions[0], y[0].copy(), None, None]
+        self._edges[2:] = [positions[-1], y[-1].copy()]
+
+        while -(-self.count // self.bucket_len) > self.n_buckets:
+            self._coarsen()
+
+        # The first new samples complete the last bucket, the others are
+        # reduced bucket by bucket
+        split = min(-first % self.bucket_len, n_new)
+        parts = [(0, split, True), (split, n_new, False)]
+        for begin, end, merge in parts:
+            if end <= begin:
+                continue
+            if merge and self._index is not None:
+                index = np.stack(_bucket_extrema(y[begin:end], end - begin)) + begin
+                self._merge_last(index + first, positions[index], np.take_along_axis(y[np.newaxis], index, axis=1))
+            else:
+                index = np.stack(_bucket_extrema(y[begin:end], self.bucket_len)) + begin
+                self._append_buckets(index + first, positions[index], np.take_along_axis(y[np.newaxis], index, axis=1))
+
+
+    def result(self):
+        """Return the decimated (x, y) as 2-D arrays with one column per trace,
+        points in their original order, as returned by minmax_decimate."""
+        if self.count == 0:
+            return np.empty((0, self.n_traces)), np.empty((0, self.n_traces))
+        if self.n_buckets < 1:
+            y = self._y[:self.count]
+            return np.broadcast_to(self._x[:self.count, np.newaxis], y.shape), y
+        if self.bucket_len == 1:
+            return self._pos[0], self._val[0]
+
+        # Interleave min and max of each bucket keeping the original sample order
+        order = self._index[0] <= self._index[1]
+        n_traces = self._val.shape[2]
+        pos = np.stack((np.where(order, self._pos[0], self._pos[1]), np.where(order, self._pos[1], self._pos[0])),
+                       axis=1).reshape(-1, n_traces)
+        val = np.stack((np.where(order, self._val[0], self._val[1]), np.where(order, self._val[1], self._val[0])),
+                       axis=1).reshape(-1, n_traces)
+        x0, y0, x1, y1 = self._edges
+        pos = np.vstack((np.full((1, n_traces), x0, dtype=pos.dtype), pos, np.full((1, n_traces), x1, dtype=pos.dtype)))
+        val = np.vstack((y0[np.newaxis, :], val, y1[np.newaxis, :]))
+
+        return pos, val
+
+
+    def _append_buckets(self, index, pos, val):
+        if self._index is None:
+            self._index, self._pos, self._val = index, pos, val
+        else:
+            self._index = np.concatenate((self._index, index), axis=1)
+            self._pos = np.concatenate((self._pos, pos), axis=1)
+            self._val = np.concatenate((self._val, val), axis=1)
+
+
+    def _merge_last(self, index, pos, val):
+        # Merge the extrema of a single bucket into the last one
+        last = (slice(None), slice(-1, None))
+        self._index[last], self._pos[last], self._val[last] = self._pick(
+            (self._index[last], self._pos[last], self._val[last]), (index, pos, val))
+
+
+    def _coarsen(self):
+        # Merge pairs of buckets and double their length
+        if self._index is not None:
+            n_pairs = self._index.shape[1] // 2
+            even = tuple(array[:, 0:2*n_pairs:2] for array in (self._index, self._pos, self._val))
+            odd = tuple(array[:, 1:2*n_pairs:2] for array in (self._index, self._pos, self._val))
+            merged = self._pick(even, odd)
+            if self._index.shape[1] % 2:
+                merged = tuple(np.concatenate((m, array[:, -1:]), axis=1)
+                               for m, array in zip(merged, (self._index, self._pos, self._val)))
+            self._index, self._pos, self._val = merged
+        self.bucket_len *= 2
+
+
+    @staticmethod
+    def _pick(a, b):
+        # Extrema of buckets a followed by buckets b, given as (index, pos, val)
+        # arrays with the minima in row 0 and the maxima in row 1. On ties the
+        # earlier sample is kept, as argmin and argmax do
+        take_b = np.stack((b[2][0] < a[2][0], b[2][1] > a[2][1]))
+        return tuple(np.where(take_b, array_b, array_a) for array_a, array_b in zip(a, b))
+
+
+    def _append(self, positions, y, first):
+        # Keep every sample, doubling the capacity of the buffers when full
+        if self._y is None or self.count > self._y.shape[0]:
+            capacity = max(self.count, 2 * (self._y.shape[0] if self._y is not None else 0))
+            new_x = np.empty(capacity, dtype=np.result_type(positions))
+            new_y = np.empty((capacity, y.shape[1]), dtype=y.dtype)
+            if self._y is not None:
+                new_x[:first] = self._x[:first]
+                new_y[:first] = self._y[:first]
+            self._x, self._y = new_x, new_y
+        self._x[first:self.count] = positions
+        self._y[first:self.count] = y
@@ -0,0 +1,51 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Figures of merit of analog-to-digital converters.
+"""
+
+import numpy as np
+from plottools.spectrum import enob
+
+
+
+def walden_fom(sndr, power, fsample, bandwidth=None):
+    """Walden figure of merit P/(2^ENOB * 2*BW) in J per conversion step, for
+    arrays of SNDR (dB) and power consumption (W) values. The bandwidth
+    defaults to fsample/2 (Nyquist converter)."""
+    bandwidth = fsample/2 if bandwidth is None else bandwidth
+    return np.asarray(power)/(np.power(2, enob(np.asarray(sndr))) * 2*bandwidth)
+
+
+
+def schreier_fom(sndr, power, fsample, bandwidth=None):
+    """Schreier figure of merit SNDR + 10*log10(BW/P) in dB, for arrays of SNDR
+    (dB) and power consumption (W) values. The bandwidth defaults to fsample/2."""
+    bandwidth = fsample/2 if bandwidth is None else bandwidth
+    return np.asarray(sndr) + 10*np.log10(bandwidth/np.asarray(power))
+
+
+
+class KeyIndex:
+    """Hash index from run/point IDs to values, used to join two tables on
+    their ID column instead of pairing rows by position."""
+
+    def __init__(self, keys, values):
+        keys = np.asarray(keys)
+        self.values = np.asarray(values)
+        self.index = dict(zip(keys.tolist(), range(len(keys))))
+        self.duplicates = len(keys) - len(self.index)
+
+
+    def lookup(self, keys):
+        """Return (found, values): a mask of the keys that are in the index and
+        the values of the found keys."""
+        positions = np.fromiter((self.index.get(key, -1) for key in np.asarray(keys).tolist()),
+                                dtype=np.int64, count=len(keys))
+        found = positions >= 0
+        return found, self.values[positions[found]]
@@ -10,11 +10,21 @@ Licensed under GNU license
 """
 
 
+import os
 import sys
+import time
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy.fftpack import fft
 from argparse import ArgumentParser
+from plottools.cache import add_cache_arguments, cached_result, load_result, result_path, store_result
+from plottools.csvio import TailReader, count_columns, is_paired, iter_traces, load_signals, load_traces, \
+    output_base
+from plottools.output import add_output_arguments, output_options, save_figure
+from plottools.profiling import Profiler, add_profile_arguments
+from plottools.resample import UniformResampler, resample
+from plottools.spectrum import DEFAULT_HARMONICS, WINDOWS, amplitude_spectrum, averaged_spectrum, \
+    harmonic_powers, leakage_bins, metrics_dtype, metrics_table, power_db, spectrum_metrics
+from plottools.style import add_render_arguments, interactive, setup_style
+from plottools.watch import add_watch_arguments, follow
 
 
 
@@ -25,13 +35,212 @@ def prettyprint_harms(xdata, ydata):
 
 
 
-def main():
-    plt.rcParams.update({
-        "text.usetex": True,
-        "font.family": "serif",
-        "font.serif": ["Palatino"]
-        })
-    
+def stem_segments(x, y, bottom):
+    """Segments of the stems of a stem plot, as taken by LineCollection.set_segments."""
+    return np.stack((np.column_stack((x, np.full(len(x), bottom))), np.column_stack((x, y))), axis=1)
+
+
+
+def resampled_traces(file, columns, first_sample, grid, npoints, chunksize, cache):
+    """Yield the selected columns of file (all but column 0 if columns is None)
+    resampled onto the uniform grid tstart + k/fsample, k < npoints (until the
+    end of the record if npoints is None), using the x data in column 0.
+
+    grid is (tstart, fsample), tstart being None to start at the x value of
+    first_sample. The file is read chunksize rows at a time.
+    """
+    tstart, fsample = grid
+    usecols = None if columns is None else [0, *columns]
+    resampler = None
+    for chunk in iter_traces(file, chunksize, columns=usecols, start=first_sample, skip_header=1, cache=cache):
+        if resampler is None:
+            resampler = UniformResampler(chunk[0, 0] if tstart is None else tstart, fsample, npoints)
+        yield resampler.update(chunk[:, 0], chunk[:, 1:])
+        if resampler.done:
+            return
+
+    if npoints is not None:
+        raise ValueError(f"The record is too short for {npoints} resampled points.")
+
+
+
+def load_window(file, columns, first_sample, N, cache, grid=None):
+    """Load the N samples of the selected columns of file that are transformed,
+    resampled onto a uniform grid if grid is not None (see resampled_traces).
+    Only the rows that are needed are parsed."""
+    if grid is None:
+        return load_traces(file, columns=columns, start=first_sample, stop=first_sample+N,
+                           skip_header=1, cache=cache)
+    return np.concatenate(list(resampled_traces(file, columns, first_sample, grid, N, 65536, cache)))
+
+
+
+def record_spectrum(file, columns, first_sample, N, mul, window, overlap, chunksize, cache, grid=None):
+    """Compute the averaged spectrum of the selected columns of file over the whole
+    record from first_sample on, reading chunksize rows at a time. If grid is
+    not None, the record is resampled first (see resampled_traces)."""
+    if grid is None:
+        chunks = iter_traces(file, chunksize, columns=columns, start=first_sample, skip_header=1, cache=cache)
+    else:
+        chunks = resampled_traces(file, columns, first_sample, grid, None, chunksize, cache)
+    return averaged_spectrum((mul * chunk for chunk in chunks), N, window, overlap)
+
+
+
+def signal_spectra(file, signals, first_sample, N, mul, window, overlap=None, grid=None):
+    """Compute the spectra of the selected signals of a file with an x/y column
+    pair per signal (see csvio.load_signals). Each signal is windowed from its
+    own first_sample on. If overlap is not None, the spectra are averaged over
+    the whole signal (see averaged_spectrum). If grid is not None, each signal
+    is resampled first, onto N points or, with overlap, until its end (see
+    resampled_traces)."""
+    spectra = []
+    for signal in load_signals(file, signals, start=first_sample):
+        if grid is None:
+            y = mul * signal.y
+        else:
+            tstart = signal.x[0] if grid[0] is None else grid[0]
+            npoints = N if overlap is None else int(np.floor((signal.x[-1] - tstart) * grid[1])) + 1
+            try:
+                y = mul * resample(signal.x, signal.y, tstart, grid[1], npoints)[:, 0]
+            except ValueError as e:
+                raise ValueError(f"Signal {signal.name}: {e}")
+        if overlap is None:
+            if len(y) < N:
+                raise ValueError(f"Signal {signal.name} has only {len(y)} samples from index "
+                                 f"{first_sample} on, {N} are needed.")
+            spectra.append(amplitude_spectrum(y[np.newaxis, :N], N, window)[0])
+        else:
+            spectra.append(averaged_spectrum([y[:, np.newaxis]], N, window, overlap)[0])
+
+    return np.stack(spectra)
+
+
+
+def compute_spectra(file, paired, first_sample, N, mul, window, overlap, chunksize, cache, grid=None,
+                    profiler=None):
+    """Compute the spectra of all the traces of file, for the plot. If overlap
+    is None, the N samples from first_sample on are transformed, otherwise the
+    spectra are averaged over the whole records, which are read chunk by chunk
+    (see record_spectrum and signal_spectra).
+
+    Returns a dict with the amplitude spectra ("spectrum") and the transformed
+    samples ("window", empty with overlap), to be stored in the result cache.
+    """
+    profiler = profiler if profiler is not None else Profiler()
+
+    if overlap is not None:
+        profiler.stage("process")
+        if paired:
+            linydata = signal_spectra(file, None, first_sample, N, mul, window, overlap, grid)
+        else:
+            columns = np.arange(1, count_columns(file))
+            linydata = record_spectrum(file, columns, first_sample, N, mul, window, overlap,
+                                       chunksize, cache, grid)
+        return {"spectrum": linydata, "window": np.empty((0, N))}
+
+    # Only the N samples that are transformed are parsed
+    if paired:
+        # Each signal has its own x data: its own N samples are taken
+        signals = load_signals(file, start=first_sample, stop=None if grid is not None else first_sample+N)
+        if grid is not None:
+            signals = [signal._replace(y=resample(signal.x, signal.y, signal.x[0] if grid[0] is None else grid[0],
+                                                  grid[1], N)[:, 0])
+                       for signal in signals]
+        short = [signal.name for signal in signals if len(signal.y) < N]
+        if short:
+            raise ValueError(f"Signals {', '.join(short)} have less than {N} samples from index {first_sample} on.")
+        ydata = mul * np.stack([signal.y for signal in signals])
+    else:
+        # Resampled data only holds the traces
+        data = load_window(file, None, first_sample, N, cache, grid)
+        ydata = mul * data.transpose()[0 if grid is not None else 1:]
+
+    # All the traces are transformed and analysed at once
+    profiler.stage("process")
+    return {"spectrum": amplitude_spectrum(ydata, N, window), "window": ydata}
+
+
+
+def write_metrics(file, outfile, first_sample, N, mul, fundam_index, window, blocksize, cache,
+                  overlap=None, chunksize=65536, grid=None, n_harmonics=DEFAULT_HARMONICS, leakage=None,
+                  result_cache=False):
+    """Compute the metrics of every trace of file without plotting and write them
+    to outfile, as .csv or, if outfile ends with .npy, as a structured NumPy
+    array. Traces are processed in blocks of blocksize columns, so that memory
+    does not depend on the number of traces. If overlap is not None, averaged
+    spectra of the whole records are used (see record_spectrum). If grid is
+    not None, the traces are resampled first (see resampled_traces): blocks of
+    traces share the grid indices computed for the x data. n_harmonics and
+    leakage are passed to metrics_table, leakage defaults to the one of window.
+
+    If result_cache, the table is stored in the result cache and taken from it
+    when the same file is analysed again with the same parameters (the block
+    and chunk sizes do not matter).
+
+    For files with an x/y column pair per signal, the signals are numbered
+    from 1 in the column field of the output."""
+    paired = is_paired(file)
+    num_cols = count_columns(file)//2 + 1 if paired else count_columns(file)
+    n_traces = num_cols - 1
+    dtype = metrics_dtype(n_harmonics)
+    leakage = leakage_bins(leakage, window)
+
+    path = cached = None
+    if result_cache:
+        params = {"start": first_sample, "npoints": N, "multiplier": mul, "fundamental": fundam_index,
+                  "window": window, "overlap": overlap, "grid": grid, "harmonics": n_harmonics,
+                  "leakage": leakage}
+        try:
+            path = result_path("fourier-metrics", [file], params)
+            cached = load_result(path)
+        except OSError:
+            path = None
+
+    if outfile.endswith(".npy"):
+        out = np.lib.format.open_memmap(outfile, mode="w+", dtype=dtype, shape=(n_traces,))
+    else:
+        out = open(outfile, "w")
+        out.write(",".join(dtype.names) + "\n")
+
+    tables = []
+    try:
+        for first_col in range(1, num_cols, blocksize):
+            columns = np.arange(first_col, min(first_col + blocksize, num_cols))
+            if cached is not None:
+                table = cached["table"][first_col-1:first_col-1+len(columns)]
+            else:
+                if paired:
+                    linydata = signal_spectra(file, columns - 1, first_sample, N, mul, window, overlap, grid)
+                elif overlap is None:
+                    data = load_window(file, columns, first_sample, N, cache, grid)
+                    linydata = amplitude_spectrum(mul * data.transpose(), N, window)
+                else:
+                    linydata = record_spectrum(file, columns, first_sample, N, mul, window,
+                                               overlap, chunksize, cache, grid)
+                table = metrics_table(linydata, fundam_index, columns, N, n_harmonics, leakage)
+                if path is not None:
+                    tables.append(table)
+
+            if isinstance(out, np.memmap):
+                out[first_col-1:first_col-1+len(columns)] = table
+            else:
+                np.savetxt(out, table, delimiter=",", fmt=["%d"] + ["%.6f"]*(len(dtype)-1))
+    finally:
+        if isinstance(out, np.memmap):
+            out.flush()
+        else:
+            out.close()
+
+    if tables:
+        try:
+            store_result(path, {"table": np.concatenate(tables)})
+        except OSError:
+            pass
+
+
+
+def main(argv=None):
     #------------------------------Argument parsing-------------------------
     p = ArgumentParser(description = 
                        "This script performs some Fourier analysis on traces imported from \
@@ -70,6 +279,86 @@ def main():
                    type = bool,
                    default = None,
                    help = "This option allows proper computation of THD when the input signal is a tone at Nyquist.")
+    p.add_argument("-fb",
+                   "--fundamental",
+                   type = int,
+                   default = None,
+                   help = "Bin of the fundamental tone. Harmonics are looked for at the bins where \
+                           they alias. Default is bin 1, or N//2 with --nyquist")
+    p.add_argument("-nh",
+                   "--harmonics",
+                   type = int,
+                   default = DEFAULT_HARMONICS,
+                   help = f"Number of harmonics, from the 2nd on, counted as distortion in the THD. \
+                           Default value is {DEFAULT_HARMONICS}")
+    p.add_argument("-lk",
+                   "--leakage",
+                   type = int,
+                   default = None,
+                   help = "Bins on each side of DC, of the fundamental and of the harmonics that \
+                           belong to the tone. Default depends on the window: 0 for rectangular, \
+                           1 for hann...")
+    p.add_argument("-N",
+                   "--npoints",
+                   type = int,
+                   default = 32,
+                   help = "Number of samples of each trace used for the FFT. Any length is supported, \
+                           powers of 2 are the fastest. Default value is 32")
+    p.add_argument("-fs",
+                   "--fsample",
+                   type = float,
+                   default = 1/(12*416e-12),
+                   help = "Sampling frequency of the traces in Hz. Default value is 1/(12*416ps)")
+    p.add_argument("-wn",
+                   "--window",
+                   type = str,
+                   choices = WINDOWS,
+                   default = "rectangular",
+                   help = "Window applied to the samples before the FFT. Default is rectangular")
+    p.add_argument("-M",
+                   "--metrics",
+                   type = str,
+                   default = None,
+                   help = "Compute-only mode: write SNDR, SFDR, THD, ENOB and fundamental power of \
+                           every trace to the specified file (.csv, or .npy for a binary table) \
+                           without plotting.")
+    p.add_argument("-bs",
+                   "--blocksize",
+                   type = int,
+                   default = 1024,
+                   help = "Number of traces processed at once in --metrics mode. \
+                           Default value is 1024")
+    p.add_argument("-av",
+                   "--average",
+                   action = "store_true",
+                   help = "Average the power spectra of all the segments of --npoints samples \
+                           in the record from --start on (Welch method) instead of analysing \
+                           a single window. The record is read in chunks, so its length is \
+                           not limited by memory.")
+    p.add_argument("-ov",
+                   "--overlap",
+                   type = float,
+                   default = 0.5,
+                   help = "Overlap between consecutive segments in --average mode, as a fraction \
+                           of --npoints. Default value is 0.5")
+    p.add_argument("-cs",
+                   "--chunksize",
+                   type = int,
+                   default = 65536,
+                   help = "Number of rows read at a time in --average mode. Default value is 65536")
+    p.add_argument("-rs",
+                   "--resample",
+                   action = "store_true",
+                   help = "Resample the traces onto a uniform grid at --fsample before the FFT, by \
+                           linear interpolation of the x data in column 0. Use it for transient \
+                           results with adaptive timesteps. --npoints points are resampled, or \
+                           the whole record in --average mode.")
+    p.add_argument("-t0",
+                   "--tstart",
+                   type = float,
+                   default = None,
+                   help = "Time of the first point of the grid in --resample mode. \
+                           Default is the x value of the --start sample")
     p.add_argument("-hp",
                    "--horizontalpos",
                    type=float,
@@ -81,31 +370,16 @@ def main():
                    type=float,
                    default=0.65, 
                    help="Vertical position of the legend. Argument is ignored if no legend " \
-                        "is displayed.")    
+                        "is displayed.")
+    add_render_arguments(p)
+    add_cache_arguments(p, "the spectra and metrics")
+    add_output_arguments(p)
+    add_profile_arguments(p)
+    add_watch_arguments(p)
 
-    
-    args = p.parse_args() 
-    #-----------------------------------------------------------------------
-
-
-    #----------------------Generate file paths and import-------------------
-    #decide in which path to look for the files (default or user defined)
-    file = args.filename
 
-    try:
-        data = np.genfromtxt(file, delimiter = ",", dtype = np.double)
-    except FileNotFoundError as e:
-        print("Error: ", e)
-        sys.exit(1) 
-
-    if args.multiplier is not None:
-        mul = args.multiplier
-    else:
-        mul = 1
-
-    data_rows = data.transpose()
-    xdata = data_rows[0, 1:]
-    ydata = mul * data_rows[1:, 1:]
+    args = p.parse_args(argv) 
+    profiler = Profiler.from_args(args, "fourier", file=args.filename)
     #-----------------------------------------------------------------------
 
 
@@ -124,48 +398,138 @@ def main():
         ylab = args.y_label
     else:
         ylab = "Magnitude [dB20]"
+
+    if args.multiplier is not None:
+        mul = args.multiplier
+    else:
+        mul = 1
+
+    N = args.npoints
+    grid = (args.tstart, args.fsample) if args.resample else None
+    if args.fundamental is not None:
+        fundam_index = args.fundamental
+    elif args.nyquist:
+        fundam_index = N//2
+    else:
+        fundam_index = 1
+    if not 0 < fundam_index <= N//2:
+        p.error(f"Option --fundamental: the fundamental must be in bins 1 to {N//2}.")
+
+    leakage = leakage_bins(args.leakage, args.window)
+    #-----------------------------------------------------------------------
+
+
+    #----------------------Generate file paths and import-------------------
+    #decide in which path to look for the files (default or user defined)
+    file = args.filename
+
+    if args.metrics is not None:
+        profiler.stage("process")
+        try:
+            write_metrics(file, args.metrics, first_sample, N, mul, fundam_index,
+                          args.window, args.blocksize, cache=args.cache,
+                          overlap=args.overlap if args.average else None, chunksize=args.chunksize,
+                          grid=grid, n_harmonics=args.harmonics, leakage=leakage,
+                          result_cache=args.resultcache)
+        except (OSError, ValueError) as e:
+            print("Error: ", e)
+            sys.exit(1)
+        profiler.finish()
+        return
+
+    if args.watch and args.average:
+        p.error("Option --watch cannot be used with --average.")
+
+    try:
+        paired = is_paired(file)
+    except OSError as e:
+        print("Error: ", e)
+        sys.exit(1)
+
+    if args.watch and args.resample:
+        p.error("Option --watch cannot be used with --resample.")
+
+    if paired and args.watch:
+        p.error("Option --watch is not supported for files with an x/y column pair per signal.")
+
+    if args.watch:
+        # The newest N samples of the growing file are analysed, --start is
+        # ignored. Wait until the first N samples have been written
+        try:
+            reader = TailReader(file, skip_header=1)
+            data = reader.read()
+            while len(data) < N:
+                time.sleep(args.refresh)
+                data = np.concatenate((data, reader.read()))
+        except (OSError, ValueError) as e:
+            print("Error: ", e)
+            sys.exit(1)
+        except KeyboardInterrupt:
+            sys.exit(1)
+
+        data = data[-N:]
+        ydata = mul * data.transpose()[1:]
+
+        # Only the newest window is transformed
+        profiler.stage("process")
+        linydata = amplitude_spectrum(ydata, N, args.window)
+    else:
+        # With --resultcache, spectra of previous runs on the same data with
+        # the same parameters are taken from the result cache
+        profiler.stage("load")
+        params = {"start": first_sample, "npoints": N, "multiplier": mul, "window": args.window,
+                  "overlap": args.overlap if args.average else None, "grid": grid}
+        try:
+            result = cached_result("fourier", [file], params,
+                                   lambda: compute_spectra(file, paired, first_sample, N, mul, args.window,
+                                                           args.overlap if args.average else None,
+                                                           args.chunksize, args.cache, grid, profiler),
+                                   enabled=args.resultcache)
+        except (OSError, ValueError) as e:
+            print("Error: ", e)
+            sys.exit(1)
+
+        ydata = result["window"] if not args.average else None
+        linydata = result["spectrum"]
     #-----------------------------------------------------------------------
 
 
     #-----------------------------------------------------------------------
-    Tsample =12*416e-12
-    N = 32                                                          #N should be a power of 2
-    sndr_list = []
-    n_traces = ydata.shape[0]
     bottomval = -80
+
+    n_traces = linydata.shape[0]
     print("\n\nn_traces: ", n_traces, "\n\n")    
-    if args.nyquist:
-        fundam_index = N//2
-    else:
-        fundam_index = 1
 
-    linydata = np.zeros((n_traces, N))
+    thd, sndr_list, sfdr = spectrum_metrics(linydata, fundam_index, N, args.harmonics, leakage)
+    for value in sndr_list:
+        print(f"SNDR = {value}")
+    if n_traces == 1:
+        print(f"THD = {thd[0]}")
+        harmonics = power_db(harmonic_powers(linydata, fundam_index, N, args.harmonics, leakage)[0])
+        for order, value in enumerate(harmonics, start=2):
+            print(f"\tH{order}: {value:.2f} dBc")
 
-    for index, curve in enumerate(ydata):
-        totransform = curve[first_sample:N+first_sample]            #compute DFT
-        plt.plot(totransform, "-o")
-        transform = fft(totransform)
-        linydata[index,:] += 2.0/N * np.abs(transform[:N])
+    profiler.stage("plot")
+    plt = setup_style(args.render)
 
-        totsquared = sum(np.power(linydata[index, 2:N//2], 2))
-        thdlin = totsquared/(linydata[index, fundam_index]**2)
-        thd = 10*np.log10(thdlin)   
-        sndr_list.append(-thd)
-        print(f"SNDR = {-thd}")
+    if ydata is not None:
+        time_lines = plt.plot(ydata[:, :N].transpose(), "-o")
 
     start_index = 0
     stop_index = N//2
     
-    xdata = np.linspace(0.0, 1.0/(Tsample), N+1) #compute x-axis for the DFT
-    ydata = 20*np.log10(linydata)               #compute DFT in dB
+    xdata = np.arange(N//2 + 1) * args.fsample/N    #compute x-axis for the DFT
+    # Empty bins (e.g. of a pure tone at Nyquist) are drawn at the bottom of the plot
+    with np.errstate(divide="ignore"):
+        ydata = 20*np.log10(linydata)               #compute DFT in dB
 
-    sfdr = ydata[0, 1] - np.max(ydata[0, 2:stop_index])
-    print(f"SFDR: {sfdr}")
+    print(f"SFDR: {sfdr[0]}")
     # prettyprint_harms(xdata, ydata[0])
 
     if len(sndr_list) >= 2 and args.savethd:
         print("saving thd list...")
-        outfile = "sndr_" + args.filename
+        dirname, basename = os.path.split(output_base(args.filename))
+        outfile = os.path.join(dirname, f"sndr_{basename}.csv")
         np.savetxt(outfile, sndr_list, delimiter = ",")
     #-----------------------------------------------------------------------
 
@@ -173,17 +537,18 @@ def main():
     #-----------------------Extract vectors, plot and save------------------
     fig, ax = plt.subplots(figsize=(7.5, 4.5))
 
+    stems = []
     for trace in ydata:
-        ax.stem(xdata[start_index:stop_index], trace[start_index:stop_index], bottom = bottomval)
+        stems.append(ax.stem(xdata[start_index:stop_index], trace[start_index:stop_index], bottom = bottomval))
 
     if len(sndr_list) == 1:
         props = dict(boxstyle='round', facecolor='wheat', alpha=0.5)
         textstr = '\n'.join((
             r'$SNDR =%.2f$' % (sndr_list[0], ),
-            r'$SFDR =%.2f$' % (sfdr, ),
+            r'$SFDR =%.2f$' % (sfdr[0], ),
             ))
-        ax.text(args.horizontalpos, args.verticalpos, textstr, transform = ax.transAxes, fontsize = 14,
-                verticalalignment = 'top', bbox = props)
+        text = ax.text(args.horizontalpos, args.verticalpos, textstr, transform = ax.transAxes, fontsize = 14,
+                       verticalalignment = 'top', bbox = props)
 
     # #add legend if necessary
     # ax.legend(loc = "lower right")
@@ -195,17 +560,60 @@ def main():
     ax.set_ylabel(ylab) #add y label
 
     #clean whitespace padding
+    profiler.stage("layout")
     fig.tight_layout()
     
     #save and show the result
-    savepath = f"dft_{args.filename[0:-4]}.png"
+    profiler.stage("save")
+    dirname, basename = os.path.split(output_base(args.filename))
+    savepath = os.path.join(dirname, f"dft_{basename}.png")
     try:
-        fig.savefig(savepath, dpi = 600)
+        save_figure(fig, savepath, 600, **output_options(args))
     except:
         print("Couldn't save figure to specified path. Check savepath and make sure it exists.")
+    profiler.finish()
+
+    # Only the newest window is transformed again when rows are appended
+    if args.watch:
+        def update(rows):
+            nonlocal data
+            data = np.concatenate((data, rows))[-N:]
+            ydata = mul * data.transpose()[1:]
+            linydata = amplitude_spectrum(ydata, N, args.window)
+            thd, sndr_list, sfdr = spectrum_metrics(linydata, fundam_index, N, args.harmonics, leakage)
+            print(f"SNDR = {', '.join(f'{value:.2f}' for value in sndr_list)}, SFDR: {sfdr[0]:.2f}")
+
+            for line, trace in zip(time_lines, ydata):
+                line.set_ydata(trace)
+            time_lines[0].axes.relim()
+            time_lines[0].axes.autoscale_view()
+
+            with np.errstate(divide="ignore"):
+                spectra_db = 20*np.log10(linydata)
+            for stem, trace in zip(stems, spectra_db):
+                x, y = xdata[start_index:stop_index], trace[start_index:stop_index]
+                stem.markerline.set_ydata(y)
+                stem.stemlines.set_segments(stem_segments(x, y, bottomval))
+            ax.relim()
+            ax.autoscale_view()
+            if len(sndr_list) == 1:
+                text.set_text('\n'.join((r'$SNDR =%.2f$' % (sndr_list[0], ), r'$SFDR =%.2f$' % (sfdr[0], ))))
+
+            if interactive(args.render):
+                time_lines[0].figure.canvas.draw_idle()
+                fig.canvas.draw_idle()
+            else:
+                save_figure(fig, savepath, 600, **output_options(args))
+
+        if interactive(args.render):
+            follow(reader, update, args.refresh, args.idletimeout,
+                   pause=plt.pause, alive=lambda: plt.fignum_exists(fig.number))
+        else:
+            follow(reader, update, args.refresh, args.idletimeout)
 
     # Show figure before exiting
-    plt.show(block=True)    
+    if interactive(args.render):
+        plt.show(block=True)    
     #-----------------------------------------------------------------------
     
     
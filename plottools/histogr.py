@@ -10,27 +10,126 @@ Licensed under GNU license
 """
 
 import sys
-import numpy as np
-import matplotlib.pyplot as plt
-import scipy.fftpack as fttp
 from argparse import ArgumentParser
+import numpy as np
+from plottools.cache import add_cache_arguments, cached_result
+from plottools.csvio import count_columns, has_header, iter_traces, output_base, read_header
+from plottools.output import add_output_arguments, output_options, save_figure
+from plottools.profiling import Profiler, add_profile_arguments
+from plottools.render import add_reuse_arguments, get_template
+from plottools.stats import Histogram, RunningStats
+from plottools.style import add_render_arguments, interactive, setup_style
 
 
 
-def main():
-    plt.rcParams.update({
-        "text.usetex": True,
-        "font.family": "serif",
-        "font.serif": ["Palatino"]
-        })
-    
+def iter_samples(files, chunksize, multiplier, cache, columns=None):
+    """Yield the samples of all files in chunks of at most chunksize values.
+
+    If columns is None and a .csv has more than one column, the header is
+    skipped and only the second column (y values) is read, otherwise the
+    whole column is read. Chunks are 1-D in this case.
+    If columns is given, the header is skipped and 2-D chunks with the
+    selected columns are yielded.
+    """
+    for file in files:
+        if columns is not None:
+            for chunk in iter_traces(file, chunksize, columns=columns, skip_header=1, cache=cache):
+                yield multiplier * chunk
+            continue
+
+        if count_columns(file) > 1:
+            chunks = iter_traces(file, chunksize, columns=[1], skip_header=1, cache=cache)
+        else:
+            chunks = iter_traces(file, chunksize, skip_header=None, cache=cache)
+
+        for chunk in chunks:
+            yield multiplier * chunk[:, 0]
+
+
+
+def text_label(name):
+    """Escape the characters of a column name that LaTeX would interpret."""
+    import matplotlib
+    if not matplotlib.rcParams["text.usetex"]:
+        return name
+    for char in "_%&#$^{}":
+        name = name.replace(char, "\\" + char)
+    return name
+
+
+
+def stats_text(mean, stdev, datalen, vmin, vmax):
+    """Text of the box with the statistics of a histogram."""
+    #textstr = f"$\mu={mean}$ \n$\sigma={stdev}$ \n $N_p={datalen}$"
+    return '\n'.join((
+        r'$\mu=%.2f$' % (mean, ),
+        r'$\sigma=%.2f$' % (stdev, ),
+        r'$N_{points}=%d$' % (datalen, ),
+        r'$Min=%.2f$' % (vmin, ),
+        r'$Max=%.2f$' % (vmax, ),
+        ))
+
+
+
+def draw_histogram(ax, edges, heights, mean, stdev, datalen, vmin, vmax, hpos, vpos, fontsize):
+    """Draw a precomputed histogram on ax, with a box holding its statistics.
+
+    Returns the bars and the text box, to be passed to update_histogram.
+    """
+    props = dict(boxstyle='round', facecolor='wheat', alpha=0.5)
+
+    # The histogram is already computed: draw one sample per bin weighted by its height
+    _, _, bars = ax.hist(edges[:-1],edgecolor='black',
+                         color='tab:orange',
+                         weights=heights,
+                         bins=edges)
+
+    text = ax.text(hpos, 
+                   vpos,
+                   stats_text(mean, stdev, datalen, vmin, vmax),
+                   transform = ax.transAxes,
+                   fontsize = fontsize,
+                   bbox = props)
+
+    return bars, text
+
+
+
+def update_histogram(bars, text, edges, heights, mean, stdev, datalen, vmin, vmax, hpos, vpos):
+    """Replace the data of a histogram drawn by draw_histogram with a new one
+    with the same number of bins, without creating new artists."""
+    for bar, left, width, height in zip(bars, edges[:-1], np.diff(edges), heights):
+        bar.set_x(left)
+        bar.set_width(width)
+        bar.set_height(height)
+
+    text.set_text(stats_text(mean, stdev, datalen, vmin, vmax))
+    text.set_position((hpos, vpos))
+    text.axes.relim()
+    text.axes.autoscale_view()
+
+
+
+def write_stats_table(path, names, stats):
+    """Save mean, sigma, min, max and N of every column to a .csv file."""
+    with open(path, "w") as f:
+        f.write("column,mean,sigma,min,max,n\n")
+        for idx, name in enumerate(names):
+            f.write(f"{name},{stats.mean[idx]:.9g},{stats.stdev[idx]:.9g},"
+                    f"{stats.min[idx]:.9g},{stats.max[idx]:.9g},{stats.n}\n")
+
+
+
+def main(argv=None):
     #------------------------------Argument parsing--------------------------------
     p = ArgumentParser(description = 
-                       "This script makes a histogram plot from a .csv file with one column.")
+                       "This script makes a histogram plot from a .csv file with one column. \
+                        If more files are passed, their samples are merged into one histogram.")
     
     p.add_argument("filename", 
                    type = str, 
-                   help = "name of the .csv file"
+                   nargs = "+",
+                   help = "name of the .csv file(s)"
                    )
     p.add_argument("-x", 
                    "--x_label",
@@ -89,83 +188,238 @@ def main():
                    nargs=2,
                    default=None, 
                    help="x-axis range. Must be specified as two float numbers which represent " \
-                    "the interval's extremities (e.g. -r -5 5).")    
-    
-    args = p.parse_args()
+                    "the interval's extremities (e.g. -r -5 5).")
+    add_render_arguments(p)
+    add_cache_arguments(p, "the statistics and the histogram")
+    p.add_argument("-cs",
+                   "--chunksize",
+                   type=int,
+                   default=1000000,
+                   help="Number of samples read at a time. Default value is 1000000")
+    p.add_argument("-c",
+                   "--columns",
+                   type=str,
+                   nargs="+",
+                   default=None,
+                   help="Indices of the columns to make histograms of, or 'all' for every column \
+                        except the first one. All the columns are processed in a single pass, \
+                        a summary table with mean, sigma, min, max and N of each column is \
+                        saved and the histograms are drawn as a grid of subplots.")
+    p.add_argument("-sb",
+                   "--sharedbins",
+                   action="store_true",
+                   help="With --columns, use the same bins for all the columns instead of \
+                        one set of bins per column.")
+    p.add_argument("-pg",
+                   "--pages",
+                   action="store_true",
+                   help="With --columns, save one histogram per page of a .pdf file instead \
+                        of a grid of subplots.")
+    p.add_argument("-t",
+                   "--table",
+                   type=str,
+                   default=None,
+                   help="With --columns, path of the summary table. Default is <filename>_stats.csv")
+    add_reuse_arguments(p)
+    add_output_arguments(p)
+    add_profile_arguments(p)
+
+
+    args = p.parse_args(argv)
+    profiler = Profiler.from_args(args, "histogr", files=args.filename)
     #------------------------------------------------------------------------------
     
         
-    #--------------------------Import list from csv--------------------------------
-    file = args.filename    
+    #----------------------------Manage columns argument---------------------------
+    files = args.filename
+
+    if args.columns is None:
+        columns = None
+    elif args.columns == ["all"]:
+        columns = list(range(1, count_columns(files[0])))
+    else:
+        try:
+            columns = [int(col) for col in args.columns]
+        except ValueError:
+            p.error("Option -c: columns must be integer indices or 'all'.")
+
+    if columns is not None:
+        if has_header(files[0]):
+            header = read_header(files[0])
+            names = [header[col] if col < len(header) else str(col) for col in columns]
+        else:
+            names = [str(col) for col in columns]
+    #------------------------------------------------------------------------------
+
+
+    #----------------Compute statistics and histogram chunk by chunk---------------
+    samples = lambda: iter_samples(files, args.chunksize, args.multiplier, args.cache, columns)
+
+    def make_histogram(lo, hi):
+        # Single column, or one histogram per column with shared or own bins
+        if columns is None:
+            return Histogram(args.bins, (lo, hi))
+        lo = np.broadcast_to(lo, (len(columns),))
+        hi = np.broadcast_to(hi, (len(columns),))
+        if args.sharedbins:
+            lo, hi = np.full(len(columns), np.min(lo)), np.full(len(columns), np.max(hi))
+        return Histogram(args.bins, (lo, hi))
+
+    def compute():
+        stats = RunningStats()
+        hist = make_histogram(*args.range) if args.range is not None else None
+
+        # Without a range the bins depend on min and max, so a second pass is
+        # needed. Data that fits in one chunk is kept to avoid reading it again
+        kept = []
+        kept_len = 0
+        for chunk in samples():
+            stats.update(chunk)
+            if hist is not None:
+                hist.update(chunk)
+            elif kept is not None:
+                kept_len += len(chunk)
+                kept = kept + [chunk] if kept_len <= args.chunksize else None
+
+        if stats.n == 0:
+            print("\nNo data found in " + ", ".join(files))
+            sys.exit(1)
+
+        if hist is None:
+            hist = make_histogram(stats.min, stats.max)
+            for chunk in (kept if kept is not None else samples()):
+                hist.update(chunk)
+
+        return {"n": stats.n, "mean": stats.mean, "m2": stats.m2, "min": stats.min, "max": stats.max,
+                "edges": hist.edges, "counts": hist.counts}
+
+    # With --resultcache, statistics and counts of previous runs on the same
+    # files with the same parameters are taken from the result cache
+    profiler.stage("process")
+    params = {"multiplier": args.multiplier, "bins": args.bins, "range": args.range, "columns": columns,
+              "sharedbins": args.sharedbins}
     try:
-        data = args.multiplier * np.genfromtxt(file, delimiter = ",")
-
-        # if data.shape has len greater than 1 it means the array imported from .csv has 2 columns
-        # therefore, take only the second column (y values)
-        if len(data.shape) > 1:
-            data = data[1:,1]
-    except OSError:
-        print("\nCould not import " + args.filename)
+        result = cached_result("histogr", files, params, compute, enabled=args.resultcache)
+    except (OSError, ValueError) as e:
+        print("\nCould not import " + ", ".join(files) + f" ({e})")
         sys.exit(1)
+
+    stats = RunningStats()
+    stats.n, stats.mean, stats.m2 = int(result["n"]), result["mean"], result["m2"]
+    stats.min, stats.max = result["min"], result["max"]
+    edges, counts = result["edges"], result["counts"]
     #------------------------------------------------------------------------------
 
 
     #---------------------------------Manage arguments-----------------------------
     if args.weights:
-        weights = np.ones(data.shape[0])/data.shape[0]
+        heights = counts/stats.n
     else:
-        weights = None
-    #------------------------------------------------------------------------------
-    
-    
-    #------------------------Compute mean and standard dev-------------------------
-    datalen = len(data)
-    mean = sum(data)/datalen
-    squares = [pow((value - mean), 2) for value in data]
-    stdev = np.sqrt(sum(squares)/datalen)
+        heights = counts
+
+    base = output_base(files[0])
     #------------------------------------------------------------------------------
     
     
     #--------------------------Generate histogram and save figure------------------
-    fig, ax = plt.subplots(figsize=(6.5, 4.5))
-    
-    props = dict(boxstyle='round', facecolor='wheat', alpha=0.5)
-    #textstr = f"$\mu={mean}$ \n$\sigma={stdev}$ \n $N_p={datalen}$"
-    textstr = '\n'.join((
-        r'$\mu=%.2f$' % (mean, ),
-        r'$\sigma=%.2f$' % (stdev, ),
-        r'$N_{points}=%d$' % (datalen, ),
-        r'$Min=%.2f$' % (np.min(data), ),
-        r'$Max=%.2f$' % (np.max(data), ),
-        ))
-    
-    ax.hist(data,edgecolor='black',
-            color='tab:orange',
-            weights=weights,
-            bins=args.bins,
-            range=args.range)
-
-    ax.text(args.horizontalpos, 
-            args.verticalpos,
-            textstr,
-            transform = ax.transAxes,
-            fontsize = 12,
-            bbox = props)
-
-    ax.set_xlabel(r'$%s$'%(args.x_label, ))
-    ax.set_ylabel(r'$%s$'%(args.y_label, ))
+    profiler.stage("plot")
+    plt = setup_style(args.render)
+    xlab = r'$%s$'%(args.x_label, )
+    ylab = r'$%s$'%(args.y_label, )
+
+    # Edges, heights and statistics of each histogram, in the order taken by
+    # draw_histogram and update_histogram
+    if columns is None:
+        panels = [(edges, heights, stats.mean, stats.stdev, stats.n, stats.min, stats.max)]
+    else:
+        panels = [(edges[idx], heights[idx], stats.mean[idx], stats.stdev[idx], stats.n,
+                   stats.min[idx], stats.max[idx]) for idx in range(len(columns))]
+    hvpos = (args.horizontalpos, args.verticalpos)
+
+    # A figure shown on screen is never reused
+    reuse = args.reuse and not interactive(args.render)
+
+    def histogram_figure(key, build):
+        # Build the figure, or take it from the template cache and replace the histograms
+        if not reuse:
+            return build(), None
+        template, new = get_template(key, build)
+        if not new:
+            for (bars, text), panel in zip(template.artists, panels):
+                update_histogram(bars, text, *panel, *hvpos)
+        return (template.fig, template.artists), template
+
+    if columns is None:
+        def build():
+            fig, ax = plt.subplots(figsize=(6.5, 4.5))
+            return fig, [draw_histogram(ax, *panels[0], *hvpos, 12)]
+
+        (fig, artists), template = histogram_figure(("histogr", args.render, args.bins), build)
+        ax = fig.axes[0]
+        ax.set_xlabel(xlab)
+        ax.set_ylabel(ylab)
+        savepath = f"{base}.png"
+    else:
+        write_stats_table(args.table if args.table is not None else f"{base}_stats.csv", names, stats)
+
+        if args.pages:
+            # One page per column. All the pages have the same layout, so the
+            # figure is built once and only its histogram and text are replaced
+            from matplotlib.backends.backend_pdf import PdfPages
+            savepath = f"{base}.pdf"
+            profiler.stage("save")
+            try:
+                with PdfPages(savepath) as pdf:
+                    fig, ax = plt.subplots(figsize=(6.5, 4.5))
+                    bars, text = draw_histogram(ax, *panels[0], *hvpos, 12)
+                    ax.set_xlabel(xlab)
+                    ax.set_ylabel(ylab)
+                    for panel, name in zip(panels, names):
+                        update_histogram(bars, text, *panel, *hvpos)
+                        ax.set_title(text_label(name))
+                        pdf.savefig(fig)
+                    plt.close(fig)
+            except OSError:
+                print("Couldn't save figure to specified path. Check savepath and make sure it exists.")
+            profiler.finish()
+            return
+
+        # Subplot grid with one histogram per column
+        ncols = int(np.ceil(np.sqrt(len(columns))))
+        nrows = int(np.ceil(len(columns)/ncols))
+
+        def build():
+            fig, axes = plt.subplots(nrows, ncols, figsize=(3.25*ncols, 2.25*nrows), squeeze=False)
+            artists = [draw_histogram(ax, *panel, *hvpos, 6) for ax, panel in zip(axes.flat, panels)]
+            for ax in axes.flat[len(columns):]:
+                ax.set_visible(False)
+            return fig, artists
+
+        (fig, artists), template = histogram_figure(("histogr", args.render, args.bins, len(columns)), build)
+        for (bars, text), name in zip(artists, names):
+            text.axes.set_title(text_label(name), fontsize=8)
+        fig.supxlabel(xlab)
+        fig.supylabel(ylab)
+        profiler.stage("layout")
+        if template is not None:
+            template.layout()
+        else:
+            fig.tight_layout()
+        savepath = f"{base}.png"
 
     # Save figure
-    savepath = f"{args.filename[0:-4]}.png"
+    profiler.stage("save")
     try:
-        fig.savefig(savepath, dpi = 600)
+        save_figure(fig, savepath, 600, **output_options(args))
     except:
         print("Couldn't save figure to specified path. Check savepath and make sure it exists.")
+    profiler.finish()
 
     # Show figure before exiting
-    plt.show(block=True)    
+    if interactive(args.render):
+        plt.show(block=True)    
     #-----------------------------------------------------------------------
     
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Saving of figures with bounded size and save time.
+
+With --compact, line artists and collections with more points than a
+threshold are rasterized inside otherwise vector figures (text, axes and
+ticks stay vector), matplotlib simplifies paths below a tunable tolerance,
+markers falling on the same pixel are drawn once and Agg draws long paths
+in chunks. The dpi depends on the format: it is the resolution of the
+rasterized artists for vector formats and of the whole image for raster
+formats. Size and save time of the file are reported.
+"""
+
+import os
+import time
+import numpy as np
+
+
+
+VECTOR_FORMATS = ("pdf", "svg", "eps", "ps")
+
+# dpi used in compact mode, other formats keep the dpi of the script
+COMPACT_DPI = {"pdf": 300, "eps": 300, "ps": 300, "svg": 150, "png": 300, "jpg": 300, "jpeg": 300}
+
+DEFAULT_RASTER_THRESHOLD = 10000
+DEFAULT_SIMPLIFY_THRESHOLD = 0.5
+DEFAULT_AGG_CHUNKSIZE = 10000
+
+
+
+def add_output_arguments(p):
+    """Add the compact output options to an ArgumentParser."""
+    p.add_argument("-cp",
+                   "--compact",
+                   action="store_true",
+                   help="Bound the size and save time of the figure: dense traces are rasterized \
+                        inside vector figures, paths are simplified and a dpi suited to the \
+                        format is used. Size and save time of the file are printed.")
+    p.add_argument("--rasterthreshold",
+                   type=int,
+                   default=DEFAULT_RASTER_THRESHOLD,
+                   help=f"In --compact mode, artists with more points than this are rasterized. \
+                        Default value is {DEFAULT_RASTER_THRESHOLD}")
+    p.add_argument("--simplifythreshold",
+                   type=float,
+                   default=DEFAULT_SIMPLIFY_THRESHOLD,
+                   help=f"In --compact mode, vertices closer than this (in pixels) to the simplified \
+                        path are dropped. Default value is {DEFAULT_SIMPLIFY_THRESHOLD}")
+    p.add_argument("--aggchunksize",
+                   type=int,
+                   default=DEFAULT_AGG_CHUNKSIZE,
+                   help=f"In --compact mode, Agg draws paths in chunks of this many vertices. \
+                        Default value is {DEFAULT_AGG_CHUNKSIZE}")
+
+
+
+def output_options(args):
+    """Keyword arguments of save_figure from the options added by add_output_arguments."""
+    return {"compact": args.compact,
+            "raster_threshold": args.rasterthreshold,
+            "simplify_threshold": args.simplifythreshold,
+            "agg_chunksize": args.aggchunksize}
+
+
+
+def count_points(artist):
+    """Number of vertices drawn by a line or a collection, 0 for other artists."""
+    from matplotlib.collections import Collection
+    from matplotlib.lines import Line2D
+
+    if isinstance(artist, Line2D):
+        return len(artist.get_xdata(orig=True))
+    if isinstance(artist, Collection):
+        return sum(len(path.vertices) for path in artist.get_paths()) + len(artist.get_offsets())
+    return 0
+
+
+
+def thin_markers(line, dpi):
+    """Keep only one marker per device pixel of a line saved at dpi. Markers
+    that land on the same pixel are drawn on top of each other, so the
+    result looks the same."""
+    if line.get_marker() in ("None", None, "", " ") or line.get_markevery() is not None:
+        return
+
+    xy = line.get_transform().transform(line.get_xydata())
+    pixels = np.round(xy * (dpi / line.figure.dpi)).astype(np.int64)
+    _, first = np.unique(pixels, axis=0, return_index=True)
+    if len(first) < len(pixels):
+        line.set_markevery(np.sort(first))
+
+
+
+def save_figure(fig, path, dpi=600, compact=False, raster_threshold=DEFAULT_RASTER_THRESHOLD,
+                simplify_threshold=DEFAULT_SIMPLIFY_THRESHOLD, agg_chunksize=DEFAULT_AGG_CHUNKSIZE):
+    """Save fig to path with the given dpi or, if compact, in compact mode
+    (see the module docstring).
+
+    Returns (size of the file in bytes, save time in seconds).
+    """
+    if not compact:
+        start = time.perf_counter()
+        fig.savefig(path, dpi=dpi)
+        return os.path.getsize(path), time.perf_counter() - start
+
+    import matplotlib
+    from matplotlib.lines import Line2D
+
+    fmt = os.path.splitext(path)[1][1:].lower() or matplotlib.rcParams["savefig.format"]
+    dpi = COMPACT_DPI.get(fmt, dpi)
+    params = {"path.simplify": True,
+              "path.simplify_threshold": simplify_threshold,
+              "agg.path.chunksize": agg_chunksize}
+
+    # The changes to the artists are undone after saving, so that a figure
+    # saved again with new data (--reuse, --watch) starts from a clean state
+    changed = []
+    start = time.perf_counter()
+    try:
+        with matplotlib.rc_context(params):
+            for ax in fig.axes:
+                for artist in ax.get_children():
+                    if count_points(artist) <= raster_threshold:
+                        continue
+                    is_line = isinstance(artist, Line2D)
+                    changed.append((artist, artist.get_rasterized(), artist.get_markevery() if is_line else None))
+                    if fmt in VECTOR_FORMATS:
+                        artist.set_rasterized(True)
+                    # Paths take the simplification settings when they are built
+                    if is_line:
+                        artist.recache_always()
+                        thin_markers(artist, dpi)
+            fig.savefig(path, dpi=dpi)
+    finally:
+        for artist, rasterized, markevery in changed:
+            artist.set_rasterized(rasterized)
+            if isinstance(artist, Line2D):
+                artist.set_markevery(markevery)
+    elapsed = time.perf_counter() - start
+
+    size = os.path.getsize(path)
+    print(f"Saved {path} ({size/1024**2:.2f} MB, dpi {dpi}) in {elapsed:.2f} s")
+    return size, elapsed
@@ -0,0 +1,152 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Per-stage instrumentation shared by the scripts. With --profile, the wall
+time, the peak of Python/NumPy allocations (tracemalloc) and the peak RSS of
+the process are recorded for every stage of the pipeline (load, process,
+plot, layout, save), a summary is printed at the end and, optionally, the
+record is written to a .json file. --cprofile additionally dumps cProfile
+statistics of the whole run, to be read with pstats or snakeviz.
+
+Stages are marked sequentially: starting a stage ends the previous one.
+Scripts that stream their input read it during the process stage.
+
+    profiler = Profiler.from_args(args)
+    profiler.stage("load")
+    ...
+    profiler.stage("plot")
+    ...
+    profiler.finish()
+"""
+
+import sys
+import json
+import time
+import platform
+import tracemalloc
+
+
+
+def add_profile_arguments(p):
+    """Add the profiling options to an ArgumentParser."""
+    p.add_argument("-pf",
+                   "--profile",
+                   action="store_true",
+                   help="Print wall time and peak memory of every stage (load, process, plot, layout, save).")
+    p.add_argument("--profile-output",
+                   type=str,
+                   default=None,
+                   help="Append the profile record to the specified .json file (one record per line). \
+                        Implies --profile.")
+    p.add_argument("--cprofile",
+                   type=str,
+                   default=None,
+                   help="Save cProfile statistics of the run to the specified file.")
+
+
+
+def peak_rss():
+    """Peak resident set size of the process in bytes, or None where the
+    resource module is not available."""
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+
+class Profiler:
+    """Record wall time and peak memory of consecutive stages of a run.
+
+    When disabled, every method is a no-op, so scripts can call it
+    unconditionally.
+    """
+
+    def __init__(self, enabled=False, output=None, cprofile=None, name=None, **info):
+        self.enabled = enabled or output is not None
+        self.output = output
+        self.name = name
+        self.info = info
+        self.stages = []
+        self._current = None
+        self._cprofile_path = cprofile
+        self._cprofile = None
+
+        if self.enabled:
+            tracemalloc.start()
+            self._start = time.perf_counter()
+        if cprofile is not None:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+
+    @classmethod
+    def from_args(cls, args, name=None, **info):
+        """Build a profiler from the options added by add_profile_arguments.
+        Keyword arguments are stored in the .json record as they are."""
+        return cls(args.profile, args.profile_output, args.cprofile, name, **info)
+
+
+    def stage(self, name):
+        """End the current stage, if any, and start the stage called name."""
+        if not self.enabled:
+            return
+        self._end_stage()
+        if hasattr(tracemalloc, "reset_peak"):
+            tracemalloc.reset_peak()
+        self._current = (name, time.perf_counter())
+
+
+    def _end_stage(self):
+        if self._current is None:
+            return
+        name, start = self._current
+        self.stages.append({"stage": name,
+                            "seconds": time.perf_counter() - start,
+                            "peak_traced": tracemalloc.get_traced_memory()[1],
+                            "peak_rss": peak_rss()})
+        self._current = None
+
+
+    def finish(self):
+        """End the last stage, print the summary and write the record and the
+        cProfile statistics if requested."""
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self._cprofile_path)
+            self._cprofile = None
+
+        if not self.enabled:
+            return
+        self._end_stage()
+        total = time.perf_counter() - self._start
+        tracemalloc.stop()
+        self.enabled = False
+
+        print(f"\nProfile{' of ' + self.name if self.name else ''}:")
+        print(f"\t{'stage':10s}{'time [s]':>12s}{'share':>8s}{'peak alloc [MB]':>18s}{'peak RSS [MB]':>16s}")
+        for record in self.stages:
+            share = record["seconds"]/total if total > 0 else 0
+            rss = f"{record['peak_rss']/1024**2:16.1f}" if record["peak_rss"] is not None else f"{'-':>16s}"
+            print(f"\t{record['stage']:10s}{record['seconds']:12.3f}{share:8.1%}"
+                  f"{record['peak_traced']/1024**2:18.1f}{rss}")
+        print(f"\t{'total':10s}{total:12.3f}")
+
+        if self.output is not None:
+            with open(self.output, "a") as f:
+                f.write(json.dumps({"script": self.name,
+                                    **self.info,
+                                    "time": time.time(),
+                                    "host": platform.node(),
+                                    "total_seconds": total,
+                                    "stages": self.stages}) + "\n")
@@ -0,0 +1,113 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Figure templates for high-throughput rendering. When many datasets are
+plotted with the same layout and style in one process (e.g. by plot_batch),
+the figure, its axes and its artists are built once and kept in a template.
+Each dataset then only replaces the data of the lines or bars and the text,
+and tight_layout runs only for the first dataset of a template.
+
+At most MAX_TEMPLATES templates are kept per process, the least recently
+used one is closed when a new one is needed, so memory does not grow over a
+batch. close_figures() closes every figure that is not a template.
+"""
+
+import gc
+from collections import OrderedDict
+
+
+
+MAX_TEMPLATES = 4
+
+_templates = OrderedDict()
+
+
+
+class FigureTemplate:
+    """A figure with its artists, reused for datasets with the same layout.
+
+    fig:        the matplotlib figure.
+    artists:    whatever the script needs to update the figure (axes, lines,
+                bars, texts), as returned by the build function.
+    """
+
+    def __init__(self, fig, artists):
+        self.fig = fig
+        self.artists = artists
+        self.laid_out = False
+
+
+    def layout(self):
+        """Run tight_layout, only the first time it is called."""
+        if not self.laid_out:
+            self.fig.tight_layout()
+            self.laid_out = True
+
+
+
+def add_reuse_arguments(p):
+    """Add the figure reuse option to an ArgumentParser."""
+    p.add_argument("-ru",
+                   "--reuse",
+                   action="store_true",
+                   help="Keep the figure in memory and reuse it for the next file with the same \
+                        layout, replacing only data and text. Useful with plot_batch and the \
+                        fast profile, ignored when the figure is shown.")
+
+
+
+def get_template(key, build):
+    """Return the template cached for key and whether it is new. If there is
+    none, build() is called and must return (fig, artists).
+
+    key must contain everything that determines the layout and the style of
+    the figure (number of axes and artists, figure size, formatting...), but
+    none of the data or text that changes between datasets.
+    """
+    import matplotlib.pyplot as plt
+
+    template = _templates.get(key)
+    if template is not None and plt.fignum_exists(template.fig.number):
+        _templates.move_to_end(key)
+        return template, False
+
+    template = FigureTemplate(*build())
+    _templates[key] = template
+    while len(_templates) > MAX_TEMPLATES:
+        _, old = _templates.popitem(last=False)
+        plt.close(old.fig)
+        gc.collect()
+
+    return template, True
+
+
+
+def close_figures():
+    """Close every figure that is not a template and free its memory."""
+    import matplotlib.pyplot as plt
+
+    kept = {template.fig.number for template in _templates.values()}
+    closed = [number for number in plt.get_fignums() if number not in kept]
+    for number in closed:
+        plt.close(number)
+
+    # Figures hold reference cycles, so their renderer buffers are only freed
+    # by the cyclic garbage collector: without this, memory grows by tens of
+    # MB per figure until a full collection happens
+    if closed:
+        gc.collect()
+
+
+
+def clear_templates():
+    """Close all the templates."""
+    import matplotlib.pyplot as plt
+
+    while _templates:
+        _, template = _templates.popitem()
+        plt.close(template.fig)
@@ -0,0 +1,145 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Resampling of traces with a non-uniform x axis (e.g. Spectre transient
+results, which use adaptive timesteps) onto a uniform grid, by linear
+interpolation. All the traces sharing an x vector are interpolated at once
+by a single gather, and the grid indices and weights are cached per x
+vector, so that blocks of traces with the same timebase only compute them
+once.
+"""
+
+import hashlib
+import numpy as np
+from collections import OrderedDict
+
+
+
+# Number of (x vector, grid) pairs whose indices and weights are kept
+MAX_CACHED_GRIDS = 64
+
+_weights = OrderedDict()
+
+
+
+def uniform_grid(tstart, fsample, first, stop):
+    """Points first to stop (excluded) of the grid tstart + k/fsample."""
+    return tstart + np.arange(first, stop) / fsample
+
+
+
+def grid_weights(x, grid):
+    """Indices and weights for the linear interpolation at the points of grid
+    of traces sampled at the increasing points x: the value at grid[k] is
+    y[index[k]]*(1 - weight[k]) + y[index[k]+1]*weight[k].
+
+    Results are cached per (x, grid), x being identified by a hash of its
+    content, so traces with the same timebase share the work.
+    """
+    x = np.ascontiguousarray(x, dtype=np.double)
+    key = (hashlib.blake2b(x, digest_size=16).digest(), len(x), grid[0], grid[-1], len(grid))
+    cached = _weights.get(key)
+    if cached is not None:
+        _weights.move_to_end(key)
+        return cached
+
+    index = np.clip(np.searchsorted(x, grid, side="right") - 1, 0, len(x) - 2)
+    x0, x1 = x[index], x[index + 1]
+    # Repeated time points (e.g. at breakpoints) have zero width
+    weight = np.divide(grid - x0, x1 - x0, out=np.zeros(len(grid)), where=x1 > x0)
+
+    _weights[key] = (index, weight)
+    if len(_weights) > MAX_CACHED_GRIDS:
+        _weights.popitem(last=False)
+
+    return index, weight
+
+
+
+def interpolate(x, y, grid):
+    """Linearly interpolate the traces in y (one per column), sampled at x, at
+    the points of grid, which must lie within [x[0], x[-1]].
+
+    Returns a 2-D array with one row per grid point and one trace per column.
+    """
+    y = np.asarray(y)
+    if y.ndim == 1:
+        y = y[:, np.newaxis]
+    index, weight = grid_weights(x, grid)
+    weight = weight[:, np.newaxis]
+
+    return y[index] * (1 - weight) + y[index + 1] * weight
+
+
+
+def resample(x, y, tstart, fsample, npoints):
+    """Resample the traces in y (one per column), sampled at the increasing
+    points x, onto npoints points of the uniform grid tstart + k/fsample.
+
+    Raises ValueError if the grid does not lie within the record.
+    """
+    grid = uniform_grid(tstart, fsample, 0, npoints)
+    if len(x) < 2 or grid[0] < x[0] or grid[-1] > x[-1]:
+        raise ValueError(f"The record covers [{x[0]:g}, {x[-1]:g}], {npoints} points from "
+                         f"{tstart:g} at {fsample:g} Hz need [{grid[0]:g}, {grid[-1]:g}].")
+
+    return interpolate(x, y, grid)
+
+
+
+class UniformResampler:
+    """Resampling of traces that arrive in chunks onto the uniform grid
+    tstart + k/fsample, k < npoints (or unbounded if npoints is None).
+
+    Every call of update() returns the grid points covered by the new chunk,
+    using the last sample of the previous chunk to interpolate across chunk
+    boundaries, so records of any length are resampled in constant memory.
+    """
+
+    def __init__(self, tstart, fsample, npoints=None):
+        self.tstart = tstart
+        self.fsample = fsample
+        self.npoints = npoints
+        self.emitted = 0
+        self._last = None       # last (x, y) sample of the previous chunk
+
+
+    @property
+    def done(self):
+        """Whether all the npoints grid points have been returned."""
+        return self.npoints is not None and self.emitted >= self.npoints
+
+
+    def update(self, x, y):
+        """Add a chunk of samples (x increasing, y with one trace per column)
+        and return the resampled values of the grid points it covers, with
+        one row per point."""
+        y = np.asarray(y)
+        if y.ndim == 1:
+            y = y[:, np.newaxis]
+        if self._last is None and len(x) > 0 and self.tstart < x[0]:
+            raise ValueError(f"The grid starts at {self.tstart:g}, before the start of the record at {x[0]:g}.")
+        if self._last is not None:
+            x = np.concatenate(([self._last[0]], x))
+            y = np.concatenate((self._last[1][np.newaxis, :], y))
+        if len(x) < 2:
+            self._last = (x[-1], y[-1]) if len(x) else self._last
+            return np.empty((0, y.shape[1]), dtype=y.dtype)
+
+        stop = int(np.floor((x[-1] - self.tstart) * self.fsample)) + 1
+        if self.npoints is not None:
+            stop = min(stop, self.npoints)
+        stop = max(stop, self.emitted)
+
+        grid = uniform_grid(self.tstart, self.fsample, self.emitted, stop)
+        self.emitted = stop
+        self._last = (x[-1], y[-1])
+
+        if len(grid) == 0:
+            return np.empty((0, y.shape[1]), dtype=y.dtype)
+        return interpolate(x, y, grid)
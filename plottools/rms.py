@@ -0,0 +1,79 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Root mean square of traces.
+"""
+
+import numpy as np
+
+
+
+def rms(traces, axis=0):
+    """Return the rms value of traces along axis (of every column, for 2-D data)."""
+    traces = np.asarray(traces)
+    return np.sqrt(np.mean(np.square(traces), axis=axis))
+
+
+
+class WindowedRMS:
+    """Moving rms of traces that arrive in chunks, over windows of window
+    samples starting every hop samples.
+
+    window must be a multiple of hop. Only the sums of squares of the last
+    window//hop - 1 complete hops and of the current hop are kept, so the
+    extra memory per trace is constant for a given window/hop ratio (a
+    single value when hop equals window), independently of the chunk size
+    and of the length of the record.
+    """
+
+    def __init__(self, window, hop=None):
+        hop = window if hop is None else hop
+        if hop <= 0 or window % hop != 0:
+            raise ValueError("The window length must be a positive multiple of the hop.")
+
+        self.window = window
+        self.hop = hop
+        self.hops_per_window = window // hop
+        self.history = None     # sums of squares of the last complete hops
+        self.current = 0.0      # sum of squares of the hop being filled
+        self.filled = 0         # samples in the hop being filled
+
+
+    def update(self, chunk):
+        """Add the samples in chunk (one trace per column) and return the rms
+        of the windows completed by them, with shape (windows, traces)."""
+        squares = np.square(np.asarray(chunk, dtype=np.double))
+        if squares.ndim == 1:
+            squares = squares[:, np.newaxis]
+        if self.history is None:
+            self.history = np.zeros((0, squares.shape[1]))
+
+        # Complete the current hop, then sum all the full hops of the chunk at once
+        need = self.hop - self.filled
+        head, rest = squares[:need], squares[need:]
+        current = self.current + np.sum(head, axis=0)
+        blocks = []
+
+        if self.filled + head.shape[0] == self.hop:
+            blocks.append(current[np.newaxis, :])
+            n_full = rest.shape[0] // self.hop
+            blocks.append(rest[:n_full*self.hop].reshape(n_full, self.hop, squares.shape[1]).sum(axis=1))
+            tail = rest[n_full*self.hop:]
+            self.current = np.sum(tail, axis=0)
+            self.filled = tail.shape[0]
+        else:
+            self.current = current
+            self.filled += head.shape[0]
+
+        hops = np.concatenate([self.history] + blocks)
+        k = self.hops_per_window
+        cumulative = np.concatenate((np.zeros((1, hops.shape[1])), np.cumsum(hops, axis=0)))
+        window_sums = cumulative[k:] - cumulative[:-k]
+        self.history = hops[max(hops.shape[0] - (k - 1), 0):] if k > 1 else hops[:0]
+
+        return np.sqrt(np.maximum(window_sums, 0)/self.window)
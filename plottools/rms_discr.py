@@ -10,28 +10,74 @@ Licensed under GNU license
 """
 
 
+import os
 import sys
 import numpy as np
-import matplotlib.pyplot as plt
 from argparse import ArgumentParser
+from plottools.cache import add_cache_arguments, cached_result
+from plottools.csvio import count_columns, is_paired, iter_traces, load_signals, load_traces, output_base
+from plottools.decimate import minmax_decimate
+from plottools.output import add_output_arguments, output_options, save_figure
+from plottools.profiling import Profiler, add_profile_arguments
+from plottools.rms import WindowedRMS, rms
+from plottools.style import add_render_arguments, interactive, setup_style
 
 
 
-def main():
-    plt.rcParams.update({
-        "text.usetex": True,
-        "font.family": "serif",
-        "font.serif": ["Palatino"]
-        })
-    
+def main(argv=None):
     #------------------------------Argument parsing-------------------------
     p = ArgumentParser(description = 
-                       "This script allows to compute the rms value of a sequence imported from a virtuoso .csv")
+                       "This script allows to compute the rms value of a sequence imported from a virtuoso .csv. \
+                        The file is read in chunks, so records of any length can be processed. \
+                        Virtuoso exports with an x/y column pair per signal are also supported, \
+                        in which case -c selects signals, counting from 1.")
     
     p.add_argument("filename", 
                    type = str, 
                    help = "name of the .csv file")
-    args = p.parse_args() 
+    add_render_arguments(p)
+    add_cache_arguments(p, "the rms values")
+    p.add_argument("-np",
+                   "--noplot",
+                   action="store_true",
+                   help="Only compute and print the rms value, without plotting the sequence.")
+    p.add_argument("-c",
+                   "--columns",
+                   type=str,
+                   nargs="+",
+                   default=["1"],
+                   help="Indices of the columns to compute the rms of, or 'all' for every column \
+                        except the first one. Default is column 1")
+    p.add_argument("-w",
+                   "--window",
+                   type=int,
+                   default=None,
+                   help="Compute a moving rms over windows of the specified number of samples \
+                        instead of a single value per column.")
+    p.add_argument("-ho",
+                   "--hop",
+                   type=int,
+                   default=None,
+                   help="Number of samples between the starts of consecutive windows. Must divide \
+                        --window. Default is --window (no overlap)")
+    p.add_argument("-o",
+                   "--output",
+                   type=str,
+                   default=None,
+                   help="Save the results to the specified .csv file: one rms value per column, \
+                        or one row per window with --window.")
+    p.add_argument("-cs",
+                   "--chunksize",
+                   type=int,
+                   default=1000000,
+                   help="Number of rows read at a time. Default value is 1000000")
+
+    add_output_arguments(p)
+    add_profile_arguments(p)
+
+
+    args = p.parse_args(argv) 
+    profiler = Profiler.from_args(args, "rms_discr", file=args.filename)
     #-----------------------------------------------------------------------
 
     #---------------------------Generate file paths-------------------------
@@ -39,23 +85,135 @@ def main():
     file = args.filename
     #-----------------------------------------------------------------------
 
+    #-------------------------Manage arguments------------------------------
     try:
-        data = np.genfromtxt(file, delimiter = ",") #if -m is true then data is imported as a numpy matrix
-    except:
+        paired = is_paired(file)
+        if args.columns == ["all"]:
+            columns = list(range(1, count_columns(file)//2 + 1 if paired else count_columns(file)))
+        else:
+            columns = [int(col) for col in args.columns]
+    except ValueError:
+        p.error("Option -c: columns must be integer indices or 'all'.")
+    except OSError:
+        print("Could not import " + args.filename)
+        sys.exit(1)
+
+    try:
+        windowed = WindowedRMS(args.window, args.hop) if args.window is not None else None
+    except ValueError as e:
+        p.error(f"Option -w: {e}")
+    #-----------------------------------------------------------------------
+
+    #-------------------Compute rms chunk by chunk--------------------------
+    signals = None
+
+    def compute():
+        nonlocal signals
+        if paired:
+            # Every signal has its own length, so signals are loaded whole
+            # and processed one at a time
+            signals = load_signals(file, [col - 1 for col in columns])
+            rms_val = np.array([rms(signal.y) for signal in signals])
+            if windowed is None:
+                return {"rms": rms_val}
+            # Signals have different numbers of windows: they are stored one
+            # after the other, with their lengths
+            window_rms = [WindowedRMS(args.window, args.hop).update(signal.y)[:, 0] for signal in signals]
+            return {"rms": rms_val, "windows": np.concatenate(window_rms),
+                    "lengths": np.array([len(values) for values in window_rms])}
+
+        sumsq = np.zeros(len(columns))
+        count = 0
+        window_rms = []
+        for chunk in iter_traces(file, args.chunksize, columns=columns, skip_header=1, cache=args.cache):
+            sumsq += np.sum(np.square(chunk, dtype=np.double), axis=0)
+            count += chunk.shape[0]
+            if windowed is not None:
+                window_rms.append(windowed.update(chunk))
+        if windowed is None:
+            return {"rms": np.sqrt(sumsq/count)}
+        return {"rms": np.sqrt(sumsq/count),
+                "windows": np.concatenate(window_rms) if window_rms else np.zeros((0, len(columns)))}
+
+    # With --resultcache, results of previous runs on the same data with the
+    # same parameters are taken from the result cache
+    profiler.stage("process")
+    params = {"columns": columns, "window": args.window, "hop": args.hop}
+    try:
+        result = cached_result("rms_discr", [file], params, compute, enabled=args.resultcache)
+    except (OSError, ValueError, IndexError):
         print("Could not import " + args.filename)
         sys.exit(1) 
 
-    yval = data.transpose()
-    yval = yval[1,1:]
+    rms_val = result["rms"]
+    if windowed is not None and paired:
+        window_rms = np.split(result["windows"], np.cumsum(result["lengths"])[:-1])
+    elif windowed is not None:
+        window_rms = result["windows"]
 
-    plt.plot(yval)
-    plt.show()
+    if len(columns) == 1:
+        print(rms_val[0])
+    else:
+        for col, val in zip(columns, rms_val):
+            print(f"{col}: {val}")
 
-    sq = [pow(val,2) for val in yval]
-    rms_val = np.sqrt(sum(sq)/len(yval))
-    print(rms_val)
+    if args.output is not None:
+        if windowed is None:
+            np.savetxt(args.output, np.column_stack((columns, rms_val)), delimiter=",",
+                       header="column,rms", comments="", fmt=["%d", "%.9g"])
+        elif paired:
+            # Signals have different numbers of windows: one row per signal and window
+            rows = [np.column_stack((np.full(len(values), col), np.arange(len(values)) * windowed.hop, values))
+                    for col, values in zip(columns, window_rms)]
+            np.savetxt(args.output, np.concatenate(rows), delimiter=",",
+                       header="signal,start,rms", comments="", fmt=["%d", "%d", "%.9g"])
+        else:
+            starts = np.arange(window_rms.shape[0]) * windowed.hop
+            np.savetxt(args.output, np.column_stack((starts, window_rms)), delimiter=",",
+                       header=",".join(["start"] + [f"rms_{col}" for col in columns]), comments="",
+                       fmt=["%d"] + ["%.9g"]*len(columns))
+    #-----------------------------------------------------------------------
+
+    #------------------------------Plot-------------------------------------
+    if not args.noplot:
+        if windowed is None:
+            profiler.stage("load")
+            if not paired:
+                data = load_traces(file, columns=columns, skip_header=1, cache=args.cache)
+            elif signals is None:
+                signals = load_signals(file, [col - 1 for col in columns])
+
+        profiler.stage("plot")
+        plt = setup_style(args.render)
+        width = int(plt.rcParams["figure.figsize"][0] * 600)
+        if paired and windowed is None:
+            # Each signal against its own x data
+            for signal in signals:
+                plt.plot(*minmax_decimate(signal.x, signal.y[:, np.newaxis], width))
+        elif paired:
+            for values in window_rms:
+                plt.plot(np.arange(len(values)) * windowed.hop, values)
+        elif windowed is None:
+            # The sequence itself, decimated to the pixel columns of the figure
+            x, y = minmax_decimate(None, data, width)
+            plt.plot(x, y)
+        else:
+            plt.plot(np.arange(window_rms.shape[0]) * windowed.hop, window_rms)
+        if interactive(args.render):
+            profiler.finish()
+            plt.show()
+        else:
+            profiler.stage("save")
+            dirname, basename = os.path.split(output_base(args.filename))
+            savepath = os.path.join(dirname, f"rms_{basename}.png")
+            try:
+                save_figure(plt.gcf(), savepath, 600, **output_options(args))
+            except:
+                print("Couldn't save figure to specified path. Check savepath and make sure it exists.")
+    profiler.finish()
+    #-----------------------------------------------------------------------
 
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,297 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Batched spectral analysis of traces. All the functions work on 2-D arrays
+with one trace per row, so that thousands of traces are transformed and
+analysed with a single call.
+"""
+
+import numpy as np
+from collections import namedtuple
+from functools import lru_cache
+
+
+
+WINDOWS = ("rectangular", "hann", "hamming", "blackman", "blackmanharris", "flattop")
+
+
+
+def get_window(name, n):
+    """Return the periodic window called name with n points."""
+    if name == "rectangular":
+        return np.ones(n)
+
+    from scipy.signal import get_window as scipy_window
+    return scipy_window(name, n)
+
+
+
+def single_sided_scale(w):
+    """Factors that turn the magnitude of the rfft of len(w) samples, taken
+    through the window w, into the amplitude of the tones in each bin."""
+    n = len(w)
+    scale = np.full(n//2 + 1, 2.0/np.sum(w))
+    scale[0] /= 2
+    if n % 2 == 0:
+        scale[-1] /= 2
+    return scale
+
+
+
+def amplitude_spectrum(traces, n, window="rectangular"):
+    """Compute the single-sided amplitude spectrum of the first n samples of
+    every trace (one per row of traces). Works for any n, power of two or not.
+
+    Amplitudes are normalised to the coherent gain of the window, so that a
+    full-scale tone in bin k has amplitude 1 in bin k. DC and, for even n, the
+    Nyquist bin have no negative-frequency image and are not doubled.
+
+    Returns an array with shape (n_traces, n//2 + 1).
+    """
+    traces = np.atleast_2d(traces)
+    if traces.shape[1] < n:
+        raise ValueError(f"Traces have {traces.shape[1]} samples, at least {n} are needed for the FFT.")
+
+    w = get_window(window, n)
+    transform = np.fft.rfft(traces[:, :n] * w, axis=1)
+
+    return single_sided_scale(w) * np.abs(transform)
+
+
+
+def averaged_spectrum(chunks, n, window="hann", overlap=0.5):
+    """Compute the averaged (Welch) amplitude spectrum of long records.
+
+    chunks:     iterable of 2-D arrays with consecutive samples of the records,
+                one record per column (as yielded by csvio.iter_traces).
+    n:          number of samples of each segment.
+    overlap:    fraction of n by which consecutive segments overlap.
+
+    Power spectra of the segments are accumulated as the chunks arrive, so
+    only one chunk plus less than one segment per record is held in memory.
+
+    Returns the amplitude spectrum corresponding to the mean power spectrum,
+    with the same shape and normalisation as amplitude_spectrum.
+    """
+    hop = max(int(round(n * (1 - overlap))), 1)
+    w = get_window(window, n)
+
+    carry = None
+    power_sum = None
+    n_segments = 0
+
+    for chunk in chunks:
+        chunk = np.asarray(chunk)
+        buffer = chunk if carry is None else np.concatenate((carry, chunk))
+        n_new = (buffer.shape[0] - n)//hop + 1 if buffer.shape[0] >= n else 0
+
+        if n_new > 0:
+            # (segments, records, n) view of all the complete segments in the buffer
+            segments = np.lib.stride_tricks.sliding_window_view(buffer, n, axis=0)[:n_new*hop:hop]
+            power = np.square(np.abs(np.fft.rfft(segments * w, axis=2))).sum(axis=0)
+            power_sum = power if power_sum is None else power_sum + power
+            n_segments += n_new
+
+        carry = buffer[n_new*hop:]
+
+    if n_segments == 0:
+        raise ValueError(f"Records are too short for a single segment of {n} samples.")
+
+    return single_sided_scale(w) * np.sqrt(power_sum/n_segments)
+
+
+
+# Half width, in bins, of the main lobe of a tone seen through each window
+LEAKAGE_BINS = {"rectangular": 0, "hann": 1, "hamming": 1, "blackman": 2, "blackmanharris": 3, "flattop": 4}
+
+# Harmonics counted as distortion, from the 2nd on
+DEFAULT_HARMONICS = 9
+
+HarmonicTable = namedtuple("HarmonicTable", ["harmonics", "harmonic_mask", "distortion_mask", "fundamental", "noise"])
+
+
+
+def fold_bin(k, n):
+    """Bin of the single-sided spectrum of n points where frequency bin k,
+    of any sign and size, appears after aliasing."""
+    k = k % n
+    return n - k if k > n//2 else k
+
+
+
+@lru_cache(maxsize=64)
+def harmonic_table(n, fundam_index, n_harmonics=DEFAULT_HARMONICS, leakage=0):
+    """Bins of the spectrum of n points used by the metrics of a tone in bin
+    fundam_index, worked out once per set of arguments.
+
+    harmonics:      (n_harmonics, 2*leakage + 1) array with the bins of the
+                    2nd to (n_harmonics + 1)th harmonics, aliased into the
+                    first Nyquist zone, with leakage bins on each side.
+    harmonic_mask:  False for the entries of harmonics that fall on DC, on
+                    the fundamental or on a bin already counted for the same
+                    harmonic, so that no power is counted twice in the power
+                    of a harmonic.
+    distortion_mask: like harmonic_mask, but a bin is counted only for the
+                    first harmonic that aliases onto it, so that no power is
+                    counted twice in the total distortion.
+    fundamental:    bins of the fundamental, with leakage bins on each side.
+    noise:          all the bins except DC and the fundamental, with their
+                    leakage bins.
+
+    The arrays are read-only, as they are shared by every caller.
+    """
+    half = n//2
+    offsets = np.arange(-leakage, leakage + 1)
+    dc = {fold_bin(k, n) for k in offsets}
+    fundamental = sorted({fold_bin(fundam_index + k, n) for k in offsets})
+    excluded = dc.union(fundamental)
+
+    harmonics = np.empty((n_harmonics, len(offsets)), dtype=np.intp)
+    harmonic_mask = np.empty(harmonics.shape, dtype=bool)
+    distortion_mask = np.empty(harmonics.shape, dtype=bool)
+    counted = set()
+    for row, order in enumerate(range(2, n_harmonics + 2)):
+        seen = set()
+        for col, k in enumerate(offsets):
+            b = fold_bin(order*fundam_index + k, n)
+            harmonics[row, col] = b
+            harmonic_mask[row, col] = b not in excluded and b not in seen
+            distortion_mask[row, col] = b not in excluded and b not in counted
+            seen.add(b)
+            counted.add(b)
+
+    noise = np.array([b for b in range(half + 1) if b not in excluded], dtype=np.intp)
+    fundamental = np.array(fundamental, dtype=np.intp)
+
+    for array in (harmonics, harmonic_mask, distortion_mask, fundamental, noise):
+        array.setflags(write=False)
+    return HarmonicTable(harmonics, harmonic_mask, distortion_mask, fundamental, noise)
+
+
+
+def power_db(ratio):
+    """Return 10*log10 of power ratios in dB, NaN where a ratio is not
+    positive (e.g. there is no harmonic left to count), without warnings."""
+    ratio = np.asarray(ratio, dtype=np.double)
+    return 10*np.log10(ratio, out=np.full(ratio.shape, np.nan), where=ratio > 0)
+
+
+
+def leakage_bins(leakage=None, window=None):
+    """Return leakage if given, otherwise the leakage of window from
+    LEAKAGE_BINS, or 0 if no window is given either."""
+    if leakage is not None:
+        return leakage
+    if window is None:
+        return 0
+    if window not in LEAKAGE_BINS:
+        raise ValueError(f"Unknown window {window}. Available windows are {', '.join(WINDOWS)}.")
+    return LEAKAGE_BINS[window]
+
+
+
+def harmonic_powers(linydata, fundam_index, n=None, n_harmonics=DEFAULT_HARMONICS, leakage=None, window=None):
+    """Power of the 2nd to (n_harmonics + 1)th harmonics of every trace (one
+    amplitude spectrum per row of linydata), relative to the fundamental.
+
+    n is the number of samples of the FFT, by default the even one matching
+    the length of the spectra. leakage and window are those of
+    spectrum_metrics. Harmonics of different orders that alias onto the
+    same bin all get its power; harmonics whose bins all fall on DC or on the
+    fundamental are NaN. Returns an array with shape (n_traces, n_harmonics).
+    """
+    n = 2*(linydata.shape[1] - 1) if n is None else n
+    table = harmonic_table(n, fundam_index, n_harmonics, leakage_bins(leakage, window))
+    power = np.square(linydata)
+
+    harmonics = np.sum(power[:, table.harmonics] * table.harmonic_mask, axis=2)
+    harmonics = harmonics/np.sum(power[:, table.fundamental], axis=1, keepdims=True)
+    return np.where(np.any(table.harmonic_mask, axis=1), harmonics, np.nan)
+
+
+
+def spectrum_metrics(linydata, fundam_index, n=None, n_harmonics=DEFAULT_HARMONICS, leakage=None, window=None):
+    """Compute distortion metrics of amplitude spectra (one per row of linydata,
+    as returned by amplitude_spectrum) of a tone in bin fundam_index.
+
+    The bins of the harmonics, aliased into the first Nyquist zone, and of DC
+    and the fundamental come from harmonic_table, with leakage bins on each
+    side of every tone. If leakage is None it is taken from LEAKAGE_BINS for
+    the window the spectra were computed with, 0 if window is None too. n is
+    the number of samples of the FFT, by default the even one matching the
+    length of the spectra.
+
+    thd:    power of the harmonics over the power of the fundamental, each
+            bin counted once. NaN if every harmonic falls on DC or on the
+            fundamental (e.g. a tone at Nyquist).
+    sndr:   power of the fundamental over the power of all the other bins
+            except DC.
+    sfdr:   peak of the fundamental over the largest other bin except DC.
+
+    Returns (thd, sndr, sfdr) as arrays in dB, one value per trace.
+    """
+    n = 2*(linydata.shape[1] - 1) if n is None else n
+    table = harmonic_table(n, fundam_index, n_harmonics, leakage_bins(leakage, window))
+    power = np.square(linydata)
+
+    fundam_power = np.sum(power[:, table.fundamental], axis=1)
+    distortion = np.sum(power[:, table.harmonics] * table.distortion_mask, axis=(1, 2))
+    noise = power[:, table.noise]
+
+    thd = power_db(distortion/fundam_power)
+    sndr = 10*np.log10(fundam_power/np.sum(noise, axis=1))
+    sfdr = 10*np.log10(power[:, fundam_index]/np.max(noise, axis=1))
+
+    return thd, sndr, sfdr
+
+
+
+METRICS_DTYPE = np.dtype([("column", np.int64),
+                          ("sndr", np.double),
+                          ("sfdr", np.double),
+                          ("thd", np.double),
+                          ("enob", np.double),
+                          ("fundamental", np.double)])
+
+
+
+def metrics_dtype(n_harmonics=0):
+    """METRICS_DTYPE followed by the power of the 2nd to (n_harmonics + 1)th
+    harmonics in dBc, in fields h2, h3..."""
+    return np.dtype(METRICS_DTYPE.descr + [(f"h{order}", np.double) for order in range(2, n_harmonics + 2)])
+
+
+
+def enob(sndr):
+    """Effective number of bits corresponding to an SNDR in dB."""
+    return (sndr - 1.76)/6.02
+
+
+
+def metrics_table(linydata, fundam_index, columns, n=None, n_harmonics=DEFAULT_HARMONICS, leakage=None,
+                  window=None):
+    """Collect the metrics of the amplitude spectra in linydata into a structured
+    array with metrics_dtype(n_harmonics), one record per trace. columns are
+    the indices of the traces in the .csv file, the fundamental power is in
+    dB and the powers of the harmonics in dBc. The other arguments are those
+    of spectrum_metrics."""
+    thd, sndr, sfdr = spectrum_metrics(linydata, fundam_index, n, n_harmonics, leakage, window)
+
+    table = np.empty(linydata.shape[0], dtype=metrics_dtype(n_harmonics))
+    table["column"] = columns
+    table["sndr"] = sndr
+    table["sfdr"] = sfdr
+    table["thd"] = thd
+    table["enob"] = enob(sndr)
+    table["fundamental"] = 20*np.log10(linydata[:, fundam_index])
+
+    harmonics = power_db(harmonic_powers(linydata, fundam_index, n, n_harmonics, leakage, window))
+    for order in range(2, n_harmonics + 2):
+        table[f"h{order}"] = harmonics[:, order - 2]
+
+    return table
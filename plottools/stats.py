@@ -0,0 +1,144 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Statistics of distributions of samples.
+"""
+
+import numpy as np
+
+
+
+def distribution_stats(data, axis=0):
+    """Compute mean, standard deviation (population), minimum, maximum and
+    number of samples of data along axis. For 2-D data every column is a
+    separate distribution.
+
+    Returns a dict with keys "mean", "stdev", "min", "max" and "n".
+    """
+    data = np.asarray(data)
+
+    return {"mean": np.mean(data, axis=axis),
+            "stdev": np.std(data, axis=axis),
+            "min": np.min(data, axis=axis),
+            "max": np.max(data, axis=axis),
+            "n": data.shape[axis]}
+
+
+
+class RunningStats:
+    """Single-pass statistics of samples that arrive in chunks.
+
+    Mean and variance are accumulated with Welford's algorithm in the
+    parallel form by Chan et al., so that chunks can be added in any order
+    and results computed on different chunks or files can be merged. Chunks
+    can be 1-D (one distribution) or 2-D, with one distribution per column.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = None
+        self.m2 = None
+        self.min = None
+        self.max = None
+
+
+    def update(self, chunk):
+        """Add the samples in chunk and return self."""
+        chunk = np.asarray(chunk, dtype=np.double)
+        if chunk.shape[0] == 0:
+            return self
+
+        other = RunningStats()
+        other.n = chunk.shape[0]
+        other.mean = np.mean(chunk, axis=0)
+        other.m2 = np.sum(np.square(chunk - other.mean), axis=0)
+        other.min = np.min(chunk, axis=0)
+        other.max = np.max(chunk, axis=0)
+
+        return self.merge(other)
+
+
+    def merge(self, other):
+        """Merge the statistics accumulated by other into self and return self."""
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.n, self.mean, self.m2, self.min, self.max = other.n, other.mean, other.m2, other.min, other.max
+            return self
+
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.n/n
+        self.m2 = self.m2 + other.m2 + np.square(delta) * self.n * other.n/n
+        self.min = np.minimum(self.min, other.min)
+        self.max = np.maximum(self.max, other.max)
+        self.n = n
+
+        return self
+
+
+    @property
+    def stdev(self):
+        """Population standard deviation."""
+        return np.sqrt(self.m2/self.n)
+
+
+    def as_dict(self):
+        """Return the statistics in the same format as distribution_stats."""
+        return {"mean": self.mean, "stdev": self.stdev, "min": self.min, "max": self.max, "n": self.n}
+
+
+
+class Histogram:
+    """Histogram with fixed, uniformly spaced bins that is accumulated chunk by
+    chunk. Histograms with the same bins can be merged.
+
+    If range holds arrays of lower and upper limits, one histogram per column
+    of the chunks is computed, each with its own bins: edges then has shape
+    (columns, bins + 1) and counts (columns, bins). All the columns are
+    binned with a single vectorized pass.
+    """
+
+    def __init__(self, bins, range):
+        lo = np.asarray(range[0], dtype=np.double)
+        hi = np.asarray(range[1], dtype=np.double)
+        equal = lo == hi
+        lo, hi = np.where(equal, lo - 0.5, lo), np.where(equal, hi + 0.5, hi)
+
+        self.bins = bins
+        self.edges = np.linspace(lo, hi, bins + 1, axis=-1)
+        self.counts = np.zeros(lo.shape + (bins,), dtype=np.int64)
+
+
+    def update(self, chunk):
+        """Add the samples in chunk and return self. Samples outside the range
+        of the bins are ignored."""
+        if self.edges.ndim == 1:
+            self.counts += np.histogram(chunk, bins=self.edges)[0]
+            return self
+
+        chunk = np.asarray(chunk, dtype=np.double)
+        lo, hi = self.edges[:, 0], self.edges[:, -1]
+        valid = (chunk >= lo) & (chunk <= hi)
+
+        # Bin index of every sample, the upper limit belongs to the last bin
+        index = np.floor((chunk - lo)/(hi - lo) * self.bins).astype(np.int64)
+        np.clip(index, 0, self.bins - 1, out=index)
+        index += np.arange(chunk.shape[1]) * self.bins
+
+        self.counts += np.bincount(index[valid], minlength=self.counts.size).reshape(self.counts.shape)
+        return self
+
+
+    def merge(self, other):
+        """Add the counts of other, which must have the same bins, and return self."""
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Only histograms with the same bins can be merged.")
+
+        self.counts += other.counts
+        return self
@@ -0,0 +1,81 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Render profiles shared by the plotting scripts.
+
+publication:    text is typeset by LaTeX with the Palatino font and the
+                figure is shown on screen after being saved.
+fast:           headless Agg backend, text is rendered by matplotlib's
+                mathtext with a Palatino-like serif font and figures are
+                only written to disk. No LaTeX installation is needed.
+"""
+
+
+
+PROFILES = ("publication", "fast")
+
+# Palatino clones that are commonly installed, DejaVu Serif ships with matplotlib
+FAST_SERIF_FONTS = ["Palatino", "Palatino Linotype", "TeX Gyre Pagella", "URW Palladio L", "P052", "DejaVu Serif"]
+
+
+
+def add_render_arguments(p):
+    """Add the render profile option to an ArgumentParser."""
+    p.add_argument("-rp",
+                   "--render",
+                   type=str,
+                   choices=PROFILES,
+                   default="publication",
+                   help="Render profile. 'publication' typesets text with LaTeX and shows the \
+                        figure, 'fast' uses mathtext and the Agg backend and only saves the \
+                        figure to disk. Default is publication")
+
+
+
+def setup_style(profile="publication", fontsize=None):
+    """Configure matplotlib for the given render profile and return pyplot.
+
+    pyplot is imported here rather than at module level, so that scripts only
+    pay for it when they actually plot something.
+    """
+    import matplotlib
+
+    if profile == "fast":
+        matplotlib.use("Agg")
+        params = {
+            "text.usetex": False,
+            "font.family": "serif",
+            "font.serif": FAST_SERIF_FONTS,
+            "mathtext.fontset": "custom",
+            "mathtext.rm": "serif",
+            "mathtext.it": "serif:italic",
+            "mathtext.bf": "serif:bold",
+            "mathtext.cal": "serif:italic",
+            }
+    elif profile == "publication":
+        params = {
+            "text.usetex": True,
+            "font.family": "serif",
+            "font.serif": ["Palatino"],
+            }
+    else:
+        raise ValueError(f"Unknown render profile {profile}. Available profiles are {', '.join(PROFILES)}.")
+
+    if fontsize is not None:
+        params["font.size"] = str(fontsize)
+
+    matplotlib.rcParams.update(params)
+
+    import matplotlib.pyplot as plt
+    return plt
+
+
+
+def interactive(profile):
+    """Whether figures should be shown on screen with the given profile."""
+    return profile != "fast"
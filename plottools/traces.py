@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Selection and scaling of traces stored as columns of a 2-D array, with the
+first column holding the x data.
+"""
+
+import numpy as np
+
+
+
+def column_index(columns):
+    """Return an index equivalent to columns that selects a view rather than a
+    copy when possible: a slice if the columns are equally spaced and
+    increasing, the array of columns otherwise."""
+    columns = np.asarray(columns, dtype=np.intp)
+
+    if len(columns) == 1:
+        return slice(columns[0], columns[0] + 1)
+    if len(columns) > 1:
+        step = columns[1] - columns[0]
+        if step > 0 and np.all(np.diff(columns) == step):
+            return slice(columns[0], columns[-1] + 1, step)
+
+    return columns
+
+
+
+def select_columns(data, columns):
+    """Split data into x data and the selected y traces.
+
+    Column 0 is the x data, unless 0 is among columns: in that case all the
+    selected columns are y data and no x data is returned.
+
+    Returns (x, y), where x is a 1-D array or None and y is a 2-D array with
+    one trace per column, in the order given by columns. Equally spaced
+    columns (e.g. all of them) are returned as views of data, not copies.
+    """
+    columns = np.asarray(columns)
+
+    if 0 in columns:
+        return None, data[:, column_index(columns)]
+
+    return data[:, 0], data[:, column_index(columns)]
+
+
+
+def scale_traces(y, multipliers=None, inplace=False):
+    """Multiply each trace (column of y) by the corresponding multiplier.
+    A single multiplier is applied to all the traces.
+
+    If inplace is True and y is writeable, y is scaled in place instead of
+    allocating a new array.
+    """
+    if multipliers is None:
+        return y
+
+    multipliers = np.reshape(np.asarray(multipliers, dtype=y.dtype), (1, -1))
+    if inplace and y.flags.writeable:
+        return np.multiply(y, multipliers, out=y)
+
+    return y * multipliers
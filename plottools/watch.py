@@ -0,0 +1,60 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+"""
+@author: spino
+Copyright (c) 2022 Valerio Spinogatti
+Licensed under GNU license
+
+Watch mode shared by the scripts: the .csv file is polled while a simulation
+is still writing it, only the appended rows are parsed (see
+csvio.TailReader) and the plot is updated at most once per refresh period.
+With the publication profile the figure on screen is redrawn, with the fast
+profile the saved figure is rewritten.
+"""
+
+import time
+
+
+
+def add_watch_arguments(p):
+    """Add the watch mode options to an ArgumentParser."""
+    p.add_argument("-wa",
+                   "--watch",
+                   action="store_true",
+                   help="Keep following the .csv file while it grows and update the plot with \
+                        the appended rows. Stop with Ctrl-C or by closing the figure.")
+    p.add_argument("--refresh",
+                   type=float,
+                   default=1.0,
+                   help="In --watch mode, minimum time between two updates of the plot, in \
+                        seconds. Default value is 1")
+    p.add_argument("--idletimeout",
+                   type=float,
+                   default=None,
+                   help="In --watch mode, stop when the file has not grown for the specified \
+                        number of seconds. By default the file is followed until interrupted.")
+
+
+
+def follow(reader, update, refresh=1.0, idle_timeout=None, pause=time.sleep, alive=lambda: True):
+    """Call update(rows) with the rows appended to the file of reader, at most
+    once every refresh seconds, until alive() returns False, the file has not
+    grown for idle_timeout seconds or the user presses Ctrl-C.
+
+    pause(seconds) is called between polls: plt.pause keeps an interactive
+    figure responsive while waiting.
+    """
+    last_growth = time.monotonic()
+    try:
+        while alive():
+            start = time.monotonic()
+            rows = reader.read()
+            if len(rows) > 0:
+                update(rows)
+                last_growth = start
+            elif idle_timeout is not None and start - last_growth > idle_timeout:
+                break
+            pause(max(refresh - (time.monotonic() - start), 0.01))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+from plottools import compute_fom_adc
+
+
+
+def write_column(path, name, values):
+    np.savetxt(path, values, delimiter=",", header=name, comments="")
+
+
+
+@pytest.mark.parametrize("chunksize", [7, 10])
+def test_positional_runs_must_match(tmp_path, capsys, chunksize):
+    # The power file ends on a chunk boundary with chunksize 10
+    sndr = tmp_path / "sndr.csv"
+    power = tmp_path / "power.csv"
+    write_column(sndr, "sndr", np.full(25, 60.0))
+    write_column(power, "power", np.full(20, 1e-3))
+    output = tmp_path / "fom.csv"
+
+    with pytest.raises(SystemExit) as exit_info:
+        compute_fom_adc.main([str(sndr), str(power), "-sc", "0", "-pc", "0", "-cs", str(chunksize),
+                              "-o", str(output)])
+
+    assert exit_info.value.code == 1
+    assert "has 25 runs but" in capsys.readouterr().out
+    assert not output.exists()
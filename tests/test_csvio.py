@@ -0,0 +1,38 @@
+import os
+
+import numpy as np
+
+from plottools.cache import evict, file_digest
+from plottools.csvio import iter_traces, load_traces
+
+
+
+def test_cache_entry_is_stored_when_the_file_ends_with_blank_lines(tmp_path, monkeypatch):
+    monkeypatch.setenv("PLOTTOOLS_CACHE_DIR", str(tmp_path / "cache"))
+    data = np.column_stack((np.arange(1000), np.sin(np.arange(1000)), np.cos(np.arange(1000))))
+    path = tmp_path / "traces.csv"
+    np.savetxt(path, data, delimiter=",", header="t,a,b", comments="")
+    with open(path, "a") as f:
+        f.write("\n\n")
+
+    chunks = list(iter_traces(str(path), 300, columns=[0, 2], cache=True))
+    np.testing.assert_array_equal(np.concatenate(chunks), data[:, [0, 2]])
+
+    entries = [name for name in os.listdir(tmp_path / "cache") if name.endswith(".npy")]
+    assert len(entries) == 1
+    entry = np.load(tmp_path / "cache" / entries[0], mmap_mode="r")
+    np.testing.assert_array_equal(entry, data)
+    np.testing.assert_array_equal(load_traces(str(path), columns=[1], start=10, stop=20, cache=True), data[10:20, [1]])
+
+
+
+def test_evict_removes_remembered_hashes(tmp_path, monkeypatch):
+    monkeypatch.setenv("PLOTTOOLS_CACHE_DIR", str(tmp_path / "cache"))
+    for i in range(5):
+        path = tmp_path / f"{i}.csv"
+        path.write_text("1\n")
+        file_digest(str(path))
+    assert sum(name.endswith(".key") for name in os.listdir(tmp_path / "cache")) == 5
+
+    evict(0)
+    assert os.listdir(tmp_path / "cache") == []
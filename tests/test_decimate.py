@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from plottools.decimate import StreamingDecimator
+
+
+
+@pytest.mark.parametrize("n_buckets", [0, 7, 1000])
+@pytest.mark.parametrize("chunksize", [1, 333, 50000])
+def test_streaming_decimation_keeps_the_extrema_of_every_bucket(n_buckets, chunksize):
+    y = np.random.default_rng(0).standard_normal((20003, 3)).cumsum(axis=0)
+    x = np.arange(len(y)) * 0.5
+    decimator = StreamingDecimator(n_buckets)
+    for begin in range(0, len(y), chunksize):
+        decimator.update(x[begin:begin+chunksize], y[begin:begin+chunksize])
+    x_dec, y_dec = decimator.result()
+
+    # Every point is a sample of the trace, in the original order
+    index = np.rint(x_dec / 0.5).astype(int)
+    assert np.all(np.diff(index, axis=0) >= 0)
+    np.testing.assert_array_equal(np.take_along_axis(y, index, axis=0), y_dec)
+
+    if n_buckets > 0:
+        bucket_len = decimator.bucket_len
+        n = -(-len(y) // bucket_len)
+        assert n <= n_buckets
+        padded = np.pad(y, ((0, n*bucket_len - len(y)), (0, 0)), mode="edge").reshape(n, bucket_len, -1)
+        pairs = y_dec[1:-1].reshape(n, 2, -1)
+        np.testing.assert_array_equal(pairs.min(axis=1), padded.min(axis=1))
+        np.testing.assert_array_equal(pairs.max(axis=1), padded.max(axis=1))
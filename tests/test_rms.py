@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+
+from plottools.rms import WindowedRMS
+
+
+
+def direct_rms(traces, window, hop):
+    starts = range(0, traces.shape[0] - window + 1, hop)
+    return np.array([np.sqrt(np.mean(np.square(traces[s:s+window]), axis=0)) for s in starts])
+
+
+
+@pytest.mark.parametrize("window, hop", [(300, 300), (40, 10), (40, 40), (12, 3)])
+@pytest.mark.parametrize("chunksize", [1, 7, 25, 299, 1150, 5000])
+def test_windowed_rms_does_not_depend_on_chunksize(window, hop, chunksize):
+    traces = np.random.default_rng(0).standard_normal((5000, 2))
+    windowed = WindowedRMS(window, hop)
+    chunks = [windowed.update(traces[begin:begin+chunksize]) for begin in range(0, len(traces), chunksize)]
+
+    np.testing.assert_allclose(np.concatenate(chunks), direct_rms(traces, window, hop))
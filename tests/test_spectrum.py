@@ -0,0 +1,38 @@
+import warnings
+
+import numpy as np
+
+from plottools.spectrum import amplitude_spectrum, harmonic_powers, metrics_table, spectrum_metrics
+
+
+
+def tones(n, bins, amplitudes):
+    k = np.arange(n)
+    return sum(a*np.cos(2*np.pi*b*k/n) for b, a in zip(bins, amplitudes))
+
+
+
+def test_harmonics_aliasing_onto_the_same_bin_are_counted_once_in_thd():
+    # With N=32 and the fundamental in bin 4, the 3rd and 5th harmonics both
+    # alias onto bin 12
+    linydata = amplitude_spectrum(tones(32, [4, 12], [1, 1e-3]), 32)
+    thd, sndr, sfdr = spectrum_metrics(linydata, 4, n_harmonics=9)
+
+    np.testing.assert_allclose(thd, -60)
+    np.testing.assert_allclose(sndr, 60)
+    h = 10*np.log10(harmonic_powers(linydata, 4, n_harmonics=9)[0])
+    np.testing.assert_allclose(h[[1, 3]], -60)
+
+
+
+def test_masked_harmonics_are_nan_without_warnings():
+    # Every harmonic of a tone at Nyquist falls on DC or on the fundamental
+    linydata = amplitude_spectrum(tones(32, [16, 3], [1, 1e-3]), 32)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        thd, sndr, sfdr = spectrum_metrics(linydata, 16)
+        table = metrics_table(linydata, 16, [1], n_harmonics=3)
+
+    assert np.isnan(thd[0])
+    np.testing.assert_allclose(sndr, 60)
+    assert all(np.isnan(table[f"h{order}"][0]) for order in (2, 3, 4))